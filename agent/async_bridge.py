@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import threading
+import weakref
 from collections.abc import Coroutine
 from typing import Any, TypeVar
 
@@ -11,27 +13,71 @@ logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# Process-wide loop reused across bridge instances. An event loop can only be driven by
+# one thread at a time and Streamlit sessions run concurrently, so it is leased to one
+# live bridge at a time; bridges created meanwhile get a private loop.
+_SHARED_LOOP: asyncio.AbstractEventLoop | None = None
+_SHARED_LOOP_LEASED = False
+_SHARED_LOOP_LOCK = threading.Lock()
+
 
 class AsyncBridge:
     """Reusable event loop that survives Streamlit reruns."""
 
     def __init__(self) -> None:
-        self._loop = asyncio.new_event_loop()
+        self._loop = _acquire_loop()
+        self._released = False
+        # Thread the loop was last installed on; reruns may hop between script threads.
+        self._loop_thread_id: int | None = None
+        # Session bridges are dropped with their session rather than shut down, so the
+        # lease is also returned when the bridge is garbage-collected.
+        self._finalizer = weakref.finalize(self, _discard_loop, self._loop)
 
     def run(self, coro: Coroutine[Any, Any, T], timeout: float = 300) -> T:
         """Run a coroutine on the persistent loop with timeout protection."""
-        if self._loop.is_closed():
-            raise RuntimeError("AsyncBridge loop is closed")
-        asyncio.set_event_loop(self._loop)
-        return self._loop.run_until_complete(asyncio.wait_for(coro, timeout=timeout))
+        if not self.is_alive:
+            raise RuntimeError("AsyncBridge loop is closed; call restart() before reuse")
+        if timeout <= 0:
+            # Match wait_for(): a non-positive timeout cancels before the coroutine starts.
+            coro.close()
+            raise TimeoutError
+        thread_id = threading.get_ident()
+        if self._loop_thread_id != thread_id:
+            asyncio.set_event_loop(self._loop)
+            self._loop_thread_id = thread_id
+        return self._loop.run_until_complete(self._run_with_timeout(coro, timeout))
+
+    @staticmethod
+    async def _run_with_timeout(coro: Coroutine[Any, Any, T], timeout: float) -> T:
+        """Await coro under a deadline without wrapping it in an extra Task."""
+        async with asyncio.timeout(timeout):
+            return await coro
 
     @property
     def is_alive(self) -> bool:
-        return not self._loop.is_closed()
+        return not self._released and not self._loop.is_closed()
+
+    def restart(self) -> None:
+        """Replace the loop with a new one; objects bound to the old loop must be discarded."""
+        self.shutdown()
+        # The shared loop is retired rather than leased again, so a broken loop is
+        # really replaced.
+        if _retire_loop(self._loop) and not self._loop.is_running():
+            self._loop.close()
+        self._loop = _acquire_loop()
+        self._released = False
+        self._loop_thread_id = None
+        self._finalizer = weakref.finalize(self, _discard_loop, self._loop)
 
     def shutdown(self) -> None:
-        """Cancel pending tasks and close the loop."""
+        """Cancel pending tasks, then return the shared loop or close a private one."""
+        if self._released:
+            return
+        self._released = True
+        # The lease is returned below; a later finalizer must not release another owner's.
+        self._finalizer.detach()
         if self._loop.is_closed():
+            _release_loop(self._loop)
             return
         try:
             if not self._loop.is_running():
@@ -39,9 +85,50 @@ class AsyncBridge:
                 for task in pending:
                     task.cancel()
                 if pending:
-                    self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                    # wait() only settles the tasks; unlike gather() it builds no result future.
+                    self._loop.run_until_complete(asyncio.wait(pending))
         except Exception:
             logger.exception("AsyncBridge shutdown failed")
         finally:
-            if not self._loop.is_closed() and not self._loop.is_running():
+            owns_loop = _release_loop(self._loop)
+            if owns_loop and not self._loop.is_closed() and not self._loop.is_running():
                 self._loop.close()
+
+
+def _acquire_loop() -> asyncio.AbstractEventLoop:
+    """Lease the shared loop, or create a private loop while it is leased."""
+    global _SHARED_LOOP, _SHARED_LOOP_LEASED
+    with _SHARED_LOOP_LOCK:
+        if _SHARED_LOOP_LEASED:
+            return asyncio.new_event_loop()
+        if _SHARED_LOOP is None or _SHARED_LOOP.is_closed():
+            _SHARED_LOOP = asyncio.new_event_loop()
+        _SHARED_LOOP_LEASED = True
+        return _SHARED_LOOP
+
+
+def _release_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    """Return the shared-loop lease; True when loop is private and should be closed."""
+    global _SHARED_LOOP_LEASED
+    with _SHARED_LOOP_LOCK:
+        if loop is _SHARED_LOOP:
+            _SHARED_LOOP_LEASED = False
+            return False
+        return True
+
+
+def _retire_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    """Stop handing out loop as the shared loop; True when the caller should close it."""
+    global _SHARED_LOOP
+    with _SHARED_LOOP_LOCK:
+        if loop is not _SHARED_LOOP or _SHARED_LOOP_LEASED:
+            # A private loop is already closed; a re-leased shared loop is in use.
+            return False
+        _SHARED_LOOP = None
+        return not loop.is_closed()
+
+
+def _discard_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Return the lease of a bridge that was never shut down, closing a private loop."""
+    if _release_loop(loop) and not loop.is_closed() and not loop.is_running():
+        loop.close()
@@ -2,21 +2,46 @@
 
 from __future__ import annotations
 
+import logging
+import os
 import re
 import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Protocol
 
 from agent.path_utils import is_within
 
+logger = logging.getLogger(__name__)
+
+# Upload bytes are copied in fixed-size chunks so peak memory stays bounded per file.
+_COPY_CHUNK_BYTES = 1 << 20
+
+# O_BINARY only exists (and matters) on Windows.
+# O_EXCL: never truncate an existing upload, e.g. a case variant of the name on macOS.
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+_UNSAFE_NAME_CHARS_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+# Background cleanups share one worker, so they run in submission order and the latest
+# future finishes after every earlier one. This state lives here rather than in app.py
+# because Streamlit re-executes the script in a fresh namespace on every rerun.
+_CLEANUP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-cleanup")
+_PENDING_CLEANUP: Future[None] | None = None
+_PENDING_CLEANUP_LOCK = threading.Lock()
+_STARTUP_CLEANUP_SCHEDULED = False
+
 
 class UploadedFileLike(Protocol):
     """Minimal interface needed from Streamlit UploadedFile."""
 
-    name: str
+    @property
+    def name(self) -> str: ...
 
-    def read(self) -> bytes: ...
+    def read(self, size: int = -1, /) -> bytes: ...
 
     def seek(self, offset: int, whence: int = 0) -> int: ...
 
@@ -48,32 +73,44 @@ def persist_attachments(
     max_file_bytes: int,
 ) -> AttachmentPersistResult:
     """Persist uploaded files under uploads/session and return relative paths."""
+    # A cleanup still running in the background would delete the files written here.
+    wait_for_scheduled_cleanup()
     root = project_root.resolve()
     storage_root = resolve_storage_root(project_root=root, storage_dir=storage_dir)
-    session_dir = storage_root / _sanitize_session_id(session_id)
+    session_dir = (storage_root / _sanitize_session_id(session_id)).resolve()
+    if not is_within(session_dir, storage_root):
+        raise ValueError("Attachment session directory must be inside the storage directory.")
     session_dir.mkdir(parents=True, exist_ok=True)
+    # Destinations are plain filenames under session_dir, so the prefix is computed once.
+    session_rel = os.path.relpath(session_dir, root)
 
     allowed = {ext.lower().lstrip(".") for ext in allowed_extensions}
     attachments: list[StoredAttachment] = []
     warnings: list[str] = []
 
     for uploaded in uploaded_files:
-        original_name = Path(getattr(uploaded, "name", "attachment")).name
+        # os.path keeps the per-file loop free of intermediate Path objects.
+        original_name = os.path.basename(getattr(uploaded, "name", "attachment"))
         safe_name = _sanitize_filename(original_name)
-        ext = Path(safe_name).suffix.lower().lstrip(".")
+        ext = os.path.splitext(safe_name)[1][1:].lower()
         if ext not in allowed:
             warnings.append(f"Skipped `{original_name}`: unsupported extension.")
             continue
 
-        payload = _read_bytes(uploaded)
-        size_bytes = len(payload)
-        if size_bytes > max_file_bytes:
+        destination = _next_available_path(session_dir, safe_name)
+        while True:
+            try:
+                size_bytes = _write_upload(uploaded, destination, max_file_bytes=max_file_bytes)
+                break
+            except FileExistsError:
+                # The scan compares names case-sensitively; case-insensitive filesystems
+                # (macOS, Windows) can still hold the name under a different case.
+                destination = _following_numbered_path(destination, safe_name)
+        if size_bytes is None:
             warnings.append(f"Skipped `{original_name}`: file size exceeds configured limit.")
             continue
 
-        destination = _next_available_path(session_dir, safe_name)
-        destination.write_bytes(payload)
-        rel_path = str(destination.resolve().relative_to(root))
+        rel_path = os.path.join(session_rel, destination.name)
 
         attachments.append(
             StoredAttachment(
@@ -92,13 +129,62 @@ def cleanup_all_uploads(*, project_root: Path, storage_dir: str) -> None:
     if not storage_root.exists():
         return
 
-    for child in storage_root.iterdir():
-        if child.name == ".gitkeep":
-            continue
-        if child.is_dir():
-            shutil.rmtree(child)
-        else:
-            child.unlink()
+    # DirEntry.is_dir() uses cached dirent data, avoiding a stat per entry.
+    with os.scandir(storage_root) as entries:
+        for entry in entries:
+            if entry.name == ".gitkeep":
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+def schedule_cleanup_all_uploads(
+    *, project_root: Path, storage_dir: str, failure_message: str = "Upload cleanup failed"
+) -> Future[None]:
+    """Run cleanup_all_uploads on a background worker, logging failure_message on error."""
+    global _PENDING_CLEANUP
+    with _PENDING_CLEANUP_LOCK:
+        future = _CLEANUP_EXECUTOR.submit(
+            _cleanup_all_uploads_logged,
+            project_root=project_root,
+            storage_dir=storage_dir,
+            failure_message=failure_message,
+        )
+        _PENDING_CLEANUP = future
+    return future
+
+
+def schedule_startup_cleanup_once(
+    *, project_root: Path, storage_dir: str, failure_message: str = "Upload cleanup failed"
+) -> Future[None] | None:
+    """Schedule the upload cleanup once per process; later calls return None."""
+    global _STARTUP_CLEANUP_SCHEDULED
+    with _PENDING_CLEANUP_LOCK:
+        if _STARTUP_CLEANUP_SCHEDULED:
+            return None
+        _STARTUP_CLEANUP_SCHEDULED = True
+    return schedule_cleanup_all_uploads(
+        project_root=project_root, storage_dir=storage_dir, failure_message=failure_message
+    )
+
+
+def wait_for_scheduled_cleanup() -> None:
+    """Block until every cleanup scheduled so far has finished."""
+    future = _PENDING_CLEANUP
+    if future is not None:
+        wait([future])
+
+
+def _cleanup_all_uploads_logged(
+    *, project_root: Path, storage_dir: str, failure_message: str
+) -> None:
+    # Nothing awaits the future for its result, so failures are logged here.
+    try:
+        cleanup_all_uploads(project_root=project_root, storage_dir=storage_dir)
+    except Exception:
+        logger.exception(failure_message)
 
 
 def resolve_storage_root(*, project_root: Path, storage_dir: str) -> Path:
@@ -113,40 +199,119 @@ def resolve_storage_root(*, project_root: Path, storage_dir: str) -> Path:
     return resolved
 
 
-def _read_bytes(uploaded_file: UploadedFileLike) -> bytes:
-    """Read bytes and rewind so reruns can re-read the same object safely."""
-    payload = uploaded_file.read()
+def _write_upload(
+    uploaded_file: UploadedFileLike, destination: Path, *, max_file_bytes: int
+) -> int | None:
+    """Stream an upload to destination; return its size, or None when over the limit."""
+    # A raw descriptor avoids allocating a BufferedWriter per (typically small) upload;
+    # chunks are written whole, so user-space buffering would only add a copy.
+    fd = os.open(destination, _WRITE_FLAGS, 0o666)
+    try:
+        total = _sendfile_upload(uploaded_file, fd, limit=max_file_bytes)
+        if total is None:
+            total = 0
+            while chunk := uploaded_file.read(_COPY_CHUNK_BYTES):
+                total += len(chunk)
+                if total > max_file_bytes:
+                    break
+                _write_all(fd, chunk)
+    finally:
+        os.close(fd)
+        _rewind(uploaded_file)
+
+    if total > max_file_bytes:
+        destination.unlink(missing_ok=True)
+        return None
+    return total
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _sendfile_upload(uploaded_file: UploadedFileLike, dst_fd: int, *, limit: int) -> int | None:
+    """Copy a file-descriptor-backed upload in the kernel; None when unsupported.
+
+    At most ``limit + 1`` bytes are copied so callers can detect oversize files.
+    """
+    fileno = getattr(uploaded_file, "fileno", None)
+    if fileno is None or not hasattr(os, "sendfile"):
+        return None
+    try:
+        src_fd = fileno()
+    except (OSError, ValueError):
+        # In-memory uploads (e.g. Streamlit's BytesIO-based UploadedFile) have no fd.
+        return None
+
+    total = 0
+    while total <= limit:
+        try:
+            sent = os.sendfile(dst_fd, src_fd, total, limit + 1 - total)
+        except OSError:
+            # Some platforms (e.g. macOS) only support socket destinations.
+            if total == 0:
+                return None
+            raise
+        if sent == 0:
+            break
+        total += sent
+    return total
+
+
+def _rewind(uploaded_file: UploadedFileLike) -> None:
+    """Rewind so reruns can re-read the same object safely."""
     try:
         uploaded_file.seek(0)
     except Exception:
         # Some file-like objects may not support rewinding.
         pass
-    return payload
 
 
 def _sanitize_filename(name: str) -> str:
-    base = Path(name).name.strip()
+    base = os.path.basename(name).strip()
     if not base:
         return "attachment.bin"
-    safe = re.sub(r"[^A-Za-z0-9._-]", "_", base)
+    safe = _UNSAFE_NAME_CHARS_RE.sub("_", base)
     return safe or "attachment.bin"
 
 
 def _sanitize_session_id(session_id: str) -> str:
-    normalized = re.sub(r"[^A-Za-z0-9._-]", "_", session_id.strip())
+    normalized = _UNSAFE_NAME_CHARS_RE.sub("_", session_id.strip())
     return normalized or "session"
 
 
 def _next_available_path(directory: Path, filename: str) -> Path:
-    target = directory / filename
-    if not target.exists():
-        return target
-
-    stem = Path(filename).stem
-    suffix = Path(filename).suffix
-    index = 1
-    while True:
-        candidate = directory / f"{stem}_{index}{suffix}"
-        if not candidate.exists():
-            return candidate
-        index += 1
+    """Return filename, or stem_N.suffix past the highest existing N, using one scandir."""
+    stem, suffix = os.path.splitext(filename)
+    pattern = _numbered_name_pattern(stem, suffix)
+    base_taken = False
+    highest = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = pattern.match(entry.name)
+            if match is None:
+                continue
+            if match.group(1) is None:
+                base_taken = True
+            else:
+                highest = max(highest, int(match.group(1)))
+
+    if not base_taken:
+        return directory / filename
+    return directory / f"{stem}_{highest + 1}{suffix}"
+
+
+def _following_numbered_path(path: Path, filename: str) -> Path:
+    """Return the stem_N.suffix name after path, which must be filename or a numbered form."""
+    stem, suffix = os.path.splitext(filename)
+    match = _numbered_name_pattern(stem, suffix).match(path.name)
+    number = int(match.group(1)) if match is not None and match.group(1) is not None else 0
+    return path.with_name(f"{stem}_{number + 1}{suffix}")
+
+
+@lru_cache(maxsize=128)
+def _numbered_name_pattern(stem: str, suffix: str) -> re.Pattern[str]:
+    return re.compile(rf"^{re.escape(stem)}(?:_(\d+))?{re.escape(suffix)}$")
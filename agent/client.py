@@ -4,14 +4,19 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
 from typing import Any, Literal, NotRequired, TypedDict
 
+import anyio
 from claude_agent_sdk import (
     AssistantMessage,
     ClaudeAgentOptions,
     ClaudeSDKClient,
+    CLIConnectionError,
+    ProcessError,
     ResultMessage,
     SystemMessage,
     TextBlock,
@@ -32,6 +37,22 @@ from config.settings import (
 
 logger = logging.getLogger(__name__)
 
+# Stream event discriminators, compared once per partial message.
+_CONTENT_BLOCK_DELTA = "content_block_delta"
+_CONTENT_BLOCK_START = "content_block_start"
+_TEXT_DELTA = "text_delta"
+_TOOL_USE = "tool_use"
+
+# Failures that leave the SDK transport unusable; anything else may retry on the same client.
+_CONNECTION_ERRORS: tuple[type[BaseException], ...] = (
+    ConnectionError,
+    TimeoutError,
+    anyio.BrokenResourceError,
+    anyio.ClosedResourceError,
+    CLIConnectionError,
+    ProcessError,
+)
+
 
 class StreamChunk(TypedDict):
     """Normalized stream payload consumed by the Streamlit UI."""
@@ -52,8 +73,9 @@ class ClaudeChatAgent:
         retry_backoff_seconds: float | None = None,
     ) -> None:
         self.project_root = project_root
-        self.model = model or DEFAULT_MODEL
-        self.permission_mode = permission_mode or DEFAULT_PERMISSION_MODE
+        self._cached_options: ClaudeAgentOptions | None = None
+        self._model = model or DEFAULT_MODEL
+        self._permission_mode: PermissionMode = permission_mode or DEFAULT_PERMISSION_MODE
         retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
         self.max_retries = max(0, retries)
         self.retry_backoff_seconds = (
@@ -63,14 +85,34 @@ class ClaudeChatAgent:
         )
         self._client: ClaudeSDKClient | None = None
         self._connected = False
+        # True while a response is being read; a failure then leaves unread messages behind.
+        self._in_flight = False
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @model.setter
+    def model(self, value: str) -> None:
+        self._model = value
+        self._cached_options = None
+
+    @property
+    def permission_mode(self) -> PermissionMode:
+        return self._permission_mode
+
+    @permission_mode.setter
+    def permission_mode(self, value: PermissionMode) -> None:
+        self._permission_mode = value
+        self._cached_options = None
 
     def _build_options(self) -> ClaudeAgentOptions:
-        """Build SDK options from local configuration."""
-        mcp_config: dict[str, Any] | str | Path = {}
-        if MCP_CONFIG_PATH.exists():
-            mcp_config = MCP_CONFIG_PATH
+        """Build SDK options from local configuration, reusing them across reconnects."""
+        if self._cached_options is not None:
+            return self._cached_options
 
-        return ClaudeAgentOptions(
+        mcp_config: dict[str, Any] | str | Path = _resolve_mcp_config_path() or {}
+        self._cached_options = ClaudeAgentOptions(
             model=self.model,
             permission_mode=self.permission_mode,
             cwd=str(self.project_root),
@@ -79,6 +121,7 @@ class ClaudeChatAgent:
             mcp_servers=mcp_config,
             sandbox={"enabled": SDK_SANDBOX_ENABLED},
         )
+        return self._cached_options
 
     async def connect(self) -> None:
         """Initialize and connect the underlying SDK client."""
@@ -105,6 +148,13 @@ class ClaudeChatAgent:
                 logger.warning("Claude SDK disconnect failed", exc_info=True)
         self._client = None
         self._connected = False
+        self._in_flight = False
+
+    def discard_client(self) -> None:
+        """Drop a client bound to a closed event loop without awaiting its teardown."""
+        self._client = None
+        self._connected = False
+        self._in_flight = False
 
     def _require_client(self) -> ClaudeSDKClient:
         """Return a connected client or raise a clear runtime error."""
@@ -114,82 +164,32 @@ class ClaudeChatAgent:
 
     async def _stream_once(self, user_message: str) -> AsyncIterator[StreamChunk]:
         """Execute one query/stream cycle."""
+        if self._in_flight:
+            # A response abandoned by a timeout, cancellation, or early exit left unread
+            # messages on this client; they would leak into this reply.
+            await self.disconnect()
         if not self._client or not self._connected:
             await self.connect()
 
         client = self._require_client()
         await client.query(user_message)
-        emitted_delta = False
-        last_tool_error_detail = ""
+        self._in_flight = True
+        state = _StreamState()
+        handlers = _message_handlers()
 
         async for message in client.receive_response():
             try:
-                if isinstance(message, StreamEvent):
-                    event = message.event
-                    event_type = event.get("type", "")
-                    if event_type == "content_block_delta":
-                        delta = event.get("delta", {})
-                        if delta.get("type") == "text_delta":
-                            text = delta.get("text", "")
-                            if text:
-                                emitted_delta = True
-                                yield {"type": "text_delta", "content": text}
-                    elif event_type == "content_block_start":
-                        block = event.get("content_block", {})
-                        if block.get("type") == "tool_use":
-                            tool_name = block.get("name", "unknown")
-                            yield {"type": "tool_use", "content": tool_name}
-
-                elif isinstance(message, AssistantMessage):
-                    for block in message.content:
-                        if isinstance(block, TextBlock) and block.text:
-                            if not emitted_delta:
-                                yield {"type": "text", "content": block.text}
-                        elif isinstance(block, ToolUseBlock):
-                            yield {"type": "tool_use", "content": block.name}
-
-                elif isinstance(message, UserMessage):
-                    if isinstance(message.content, list):
-                        for block in message.content:
-                            if isinstance(block, ToolResultBlock):
-                                is_err = block.is_error or False
-                                detail = _extract_tool_result_detail(block.content)
-                                if is_err and detail:
-                                    last_tool_error_detail = detail
-                                yield {
-                                    "type": "tool_result",
-                                    "content": (
-                                        f"error: {detail}"
-                                        if is_err and detail
-                                        else ("error" if is_err else "success")
-                                    ),
-                                }
-
-                elif isinstance(message, ResultMessage):
-                    if message.is_error:
-                        error_detail = _build_result_error_detail(
-                            message=message,
-                            last_tool_error_detail=last_tool_error_detail,
-                        )
-                        yield {"type": "error", "content": error_detail}
-                    else:
-                        yield {"type": "done", "content": message.session_id}
-
-                elif isinstance(message, (SystemMessage,)):
-                    subtype = getattr(message, "subtype", "?")
-                    logger.debug(
-                        "Ignored system message: subtype=%s",
-                        subtype,
-                    )
-
-                else:
-                    logger.debug("Ignored unknown message class: %s", type(message).__name__)
+                handler = _lookup_handler(handlers, type(message))
+                for chunk in handler(message, state):
+                    yield chunk
             except Exception as exc:
                 logger.warning("Skipping unhandled message: %s", exc)
+        self._in_flight = False
 
     async def send_message_streaming(self, user_message: str) -> AsyncIterator[StreamChunk]:
         """Stream a response with bounded retry on transient SDK failures."""
         last_error: Exception | None = None
+        reused_client = False
 
         for attempt in range(self.max_retries + 1):
             try:
@@ -204,7 +204,13 @@ class ClaudeChatAgent:
                     self.max_retries + 1,
                     exc,
                 )
-                await self.disconnect()
+                # A non-transport failure before any response was read leaves the client
+                # usable, so retry on it once before paying for a fresh CLI subprocess.
+                if self._in_flight or reused_client or isinstance(exc, _CONNECTION_ERRORS):
+                    await self.disconnect()
+                    reused_client = False
+                else:
+                    reused_client = True
 
                 if attempt < self.max_retries:
                     backoff = self.retry_backoff_seconds * (attempt + 1)
@@ -217,6 +223,125 @@ class ClaudeChatAgent:
         yield {"type": "error", "content": error_message}
 
 
+@dataclass
+class _StreamState:
+    """Per-response bookkeeping shared by the message handlers."""
+
+    emitted_delta: bool = False
+    last_tool_error_detail: str = ""
+
+
+_MessageHandler = Callable[[Any, _StreamState], Iterator[StreamChunk]]
+
+
+def _handle_stream_event(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    event = message.event
+    event_type = event.get("type")
+    if event_type == _CONTENT_BLOCK_DELTA:
+        delta = event.get("delta")
+        if delta is not None and delta.get("type") == _TEXT_DELTA:
+            text = delta.get("text")
+            if text:
+                state.emitted_delta = True
+                yield {"type": "text_delta", "content": text}
+    elif event_type == _CONTENT_BLOCK_START:
+        block = event.get("content_block")
+        if block is not None and block.get("type") == _TOOL_USE:
+            tool_name = block.get("name", "unknown")
+            yield {"type": "tool_use", "content": tool_name}
+
+
+def _handle_assistant_message(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    if state.emitted_delta:
+        # Text already arrived as deltas; only tool calls remain to report.
+        for block in message.content:
+            if isinstance(block, ToolUseBlock):
+                yield {"type": "tool_use", "content": block.name}
+        return
+    for block in message.content:
+        if isinstance(block, TextBlock) and block.text:
+            yield {"type": "text", "content": block.text}
+        elif isinstance(block, ToolUseBlock):
+            yield {"type": "tool_use", "content": block.name}
+
+
+def _handle_user_message(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    if not isinstance(message.content, list):
+        return
+    for block in message.content:
+        if isinstance(block, ToolResultBlock):
+            is_err = block.is_error or False
+            detail = _extract_tool_result_detail(block.content)
+            if is_err and detail:
+                state.last_tool_error_detail = detail
+            yield {
+                "type": "tool_result",
+                "content": (
+                    f"error: {detail}" if is_err and detail else ("error" if is_err else "success")
+                ),
+            }
+
+
+def _handle_result_message(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    if message.is_error:
+        error_detail = _build_result_error_detail(
+            message=message,
+            last_tool_error_detail=state.last_tool_error_detail,
+        )
+        yield {"type": "error", "content": error_detail}
+    else:
+        yield {"type": "done", "content": message.session_id}
+
+
+def _handle_system_message(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    del state
+    subtype = getattr(message, "subtype", "?")
+    logger.debug("Ignored system message: subtype=%s", subtype)
+    yield from ()
+
+
+def _handle_unknown_message(message: Any, state: _StreamState) -> Iterator[StreamChunk]:
+    del state
+    logger.debug("Ignored unknown message class: %s", type(message).__name__)
+    yield from ()
+
+
+def _message_handlers() -> dict[type, _MessageHandler]:
+    """Map SDK message classes to handlers; built per stream so patched classes apply."""
+    return {
+        StreamEvent: _handle_stream_event,
+        AssistantMessage: _handle_assistant_message,
+        UserMessage: _handle_user_message,
+        ResultMessage: _handle_result_message,
+        SystemMessage: _handle_system_message,
+    }
+
+
+def _lookup_handler(handlers: dict[type, _MessageHandler], message_type: type) -> _MessageHandler:
+    """Resolve a handler by exact type, falling back to subclass checks once per type."""
+    handler = handlers.get(message_type)
+    if handler is not None:
+        return handler
+    handler = _handle_unknown_message
+    for base, candidate in list(handlers.items()):
+        if issubclass(message_type, base):
+            handler = candidate
+            break
+    handlers[message_type] = handler
+    return handler
+
+
+def reset_mcp_cache() -> None:
+    """Forget the cached MCP config lookup so the next connect re-checks the file."""
+    _resolve_mcp_config_path.cache_clear()
+
+
+@cache
+def _resolve_mcp_config_path() -> Path | None:
+    """Return the MCP config path when it exists; checked once per process."""
+    return MCP_CONFIG_PATH if MCP_CONFIG_PATH.exists() else None
+
+
 def _extract_tool_result_detail(content: str | list[dict[str, Any]] | None) -> str:
     """Extract readable error detail from a tool_result content payload."""
     if isinstance(content, str):
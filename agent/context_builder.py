@@ -4,18 +4,22 @@ from __future__ import annotations
 
 from agent.attachments import StoredAttachment
 
+_SEPARATOR = "\n\n"
+_TRUNCATION_SUFFIX = "...[context truncated]"
+
 
 class PromptContextBuilder:
     """Build a bounded prompt string with optional context sections."""
 
     def __init__(self, user_message: str, *, max_chars: int) -> None:
-        self._user_message = user_message
+        self._user_section = f"[USER_MESSAGE]\n{user_message.strip()}"
         self._max_chars = max_chars
         self._sections: list[str] = []
 
     def add_knowledge_preamble(self, preamble: str) -> None:
-        if preamble.strip():
-            self._sections.append(preamble.strip())
+        stripped = preamble.strip()
+        if stripped:
+            self._sections.append(stripped)
 
     def add_attachments(self, attachments: list[StoredAttachment]) -> None:
         if not attachments:
@@ -32,37 +36,47 @@ class PromptContextBuilder:
         self._sections.append("\n".join(lines))
 
     def build(self) -> str:
-        user_section = f"[USER_MESSAGE]\n{self._user_message.strip()}"
+        user_section = self._user_section
         if self._max_chars <= len(user_section):
             return user_section[: self._max_chars]
 
         if not self._sections:
             return user_section
 
+        total = len(user_section) + sum(len(section) + 2 for section in self._sections)
+        if total <= self._max_chars:
+            return _SEPARATOR.join([*self._sections, user_section])
+
         # Reserve separator before [USER_MESSAGE] section.
-        remaining = self._max_chars - len(user_section) - 2
+        remaining = self._max_chars - len(user_section) - len(_SEPARATOR)
         if remaining <= 0:
             return user_section
 
-        context_sections: list[str] = []
-        suffix = "...[context truncated]"
-        separator_cost = 2  # "\n\n"
+        # Flat pieces (sections, truncation suffixes, separators) joined once at the end.
+        pieces: list[str] = []
+        suffix_len = len(_TRUNCATION_SUFFIX)
 
         for section in self._sections:
             if remaining <= 0:
                 break
 
-            candidate = section
-            if len(candidate) > remaining:
-                if remaining <= len(suffix):
-                    candidate = suffix[:remaining]
-                else:
-                    candidate = f"{candidate[: remaining - len(suffix)]}{suffix}"
-
-            context_sections.append(candidate)
-            remaining -= len(candidate) + separator_cost
-
-        if not context_sections:
+            section_len = len(section)
+            if section_len <= remaining:
+                pieces.append(section)
+                used = section_len
+            elif remaining <= suffix_len:
+                pieces.append(_TRUNCATION_SUFFIX[:remaining])
+                used = remaining
+            else:
+                pieces.append(section[: remaining - suffix_len])
+                pieces.append(_TRUNCATION_SUFFIX)
+                used = remaining
+
+            pieces.append(_SEPARATOR)
+            remaining -= used + len(_SEPARATOR)
+
+        if not pieces:
             return user_section
 
-        return "\n\n".join([*context_sections, user_section])
+        pieces.append(user_section)
+        return "".join(pieces)
@@ -2,16 +2,66 @@
 
 from __future__ import annotations
 
+import json
 import logging
+import mmap
+import os
 import re
 import subprocess
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import IO, cast
 
 from agent.path_utils import is_within
 
 logger = logging.getLogger(__name__)
 
+# Below this much markdown, an in-process regex scan beats spawning rg.
+_IN_PROCESS_SEARCH_MAX_BYTES = 256 * 1024
+
+_RG_TIMEOUT_SECONDS = 5
+
+# Files at least this large are scanned as bytes through mmap instead of line by line.
+_MMAP_MIN_BYTES = 16 * 1024
+# Non-ASCII characters that str patterns with re.IGNORECASE match to an ASCII letter.
+_ASCII_CASE_FOLD_EXTRAS = {"i": ("\u0130", "\u0131"), "k": ("\u212a",), "s": ("\u017f",)}
+_TO_ASCII_CASE_FOLD = str.maketrans(
+    {extra: letter for letter, extras in _ASCII_CASE_FOLD_EXTRAS.items() for extra in extras}
+)
+
+
+@dataclass
+class _MarkdownListing:
+    """Cached walk of a knowledge folder."""
+
+    # mtime_ns of every directory walked; changes when entries are added, removed, or renamed.
+    dir_mtimes: dict[str, int]
+    paths: list[str]
+    # Size at walk time. In-place edits can make it stale, which only affects whether
+    # search runs in-process or via rg, never the results.
+    total_bytes: int
+    # (mtime_ns, size) of each path at walk time; in-place edits leave dir_mtimes as is.
+    file_stats: list[tuple[int, int]]
+    # When file_stats were last confirmed against the files (time.monotonic()).
+    verified_at: float
+
+
+_MARKDOWN_LIST_CACHE: dict[Path, _MarkdownListing] = {}
+
+# Searches re-stat every markdown file at most this often; in between, a cached listing
+# is trusted once its directories are unchanged, so a warm search costs one stat per
+# directory. An in-place edit can therefore take this long to show up.
+_FILE_STATS_RECHECK_SECONDS = 2.0
+
+_WORD_TERM_RE = re.compile(r"[A-Za-z0-9_]+")
+# Punctuation trimmed from either end of a query token; inner characters are kept.
+_TOKEN_EDGE_PUNCTUATION = "`'\".,!?():;[]{}"
+
 _EN_STOPWORDS = {
     "a",
     "an",
@@ -56,8 +106,25 @@ class KnowledgeMatch:
     snippet: str
 
 
+_SearchCacheKey = tuple[str, str, str, int]
+
+# (knowledge_dir, project_root, pattern, max_hits) -> (listing searched, hits).
+# Keyed on the derived pattern, so differently worded prompts with the same terms hit.
+# Any change to the corpus produces a new listing, so entries are checked by identity.
+_SEARCH_CACHE: OrderedDict[_SearchCacheKey, tuple[_MarkdownListing, list[KnowledgeMatch]]] = (
+    OrderedDict()
+)
+_SEARCH_CACHE_MAX_ENTRIES = 256
+_SEARCH_CACHE_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=16)
 def resolve_knowledge_dir(project_root: Path, knowledge_dir: str) -> Path:
-    """Resolve knowledge directory and ensure it stays within project root."""
+    """Resolve knowledge directory and ensure it stays within project root.
+
+    Successful results are cached per process since the app passes fixed settings on
+    every prompt; a ValueError is not cached.
+    """
     root = project_root.resolve()
     candidate = Path(knowledge_dir)
     if not candidate.is_absolute():
@@ -72,12 +139,90 @@ def list_knowledge_markdown_files(knowledge_dir: Path, project_root: Path) -> li
     """Return sorted project-relative markdown paths under the knowledge folder."""
     if not knowledge_dir.exists():
         return []
-    root = project_root.resolve()
-    files: list[str] = []
-    for path in sorted(knowledge_dir.rglob("*.md")):
-        if path.is_file():
-            files.append(str(path.resolve().relative_to(root)))
-    return files
+    root = str(project_root.resolve())
+    return [os.path.relpath(path, root) for path in _markdown_paths(knowledge_dir)]
+
+
+def _markdown_paths(knowledge_dir: Path) -> list[str]:
+    """Return sorted markdown file paths, re-walking only when a directory changed."""
+    return _markdown_listing(knowledge_dir).paths
+
+
+def _markdown_listing(knowledge_dir: Path) -> _MarkdownListing:
+    cached = _MARKDOWN_LIST_CACHE.get(knowledge_dir)
+    if cached is not None and _dir_mtimes_unchanged(cached.dir_mtimes):
+        return cached
+
+    dir_mtimes: dict[str, int] = {}
+    paths: list[str] = []
+    file_stats: dict[str, tuple[int, int]] = {}
+    total_bytes = 0
+    pending = [str(knowledge_dir)]
+    while pending:
+        directory = pending.pop()
+        try:
+            dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    # Like rg: hidden entries are skipped and symlinks are not followed, so
+                    # a link cannot pull in files from outside the knowledge folder.
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith(".md") and entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        paths.append(entry.path)
+                        file_stats[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                        total_bytes += stat.st_size
+        except OSError:
+            continue
+    # Sort by path components, matching the order sorted() gives Path objects.
+    paths.sort(key=lambda path: path.split(os.sep))
+    listing = _MarkdownListing(
+        dir_mtimes=dir_mtimes,
+        paths=paths,
+        total_bytes=total_bytes,
+        file_stats=[file_stats[path] for path in paths],
+        verified_at=time.monotonic(),
+    )
+    _MARKDOWN_LIST_CACHE[knowledge_dir] = listing
+    return listing
+
+
+def _checked_markdown_listing(knowledge_dir: Path) -> _MarkdownListing:
+    """Return the listing, re-walking it if a file changed in place since the last check."""
+    listing = _markdown_listing(knowledge_dir)
+    now = time.monotonic()
+    if now - listing.verified_at < _FILE_STATS_RECHECK_SECONDS:
+        return listing
+    if _file_stats_unchanged(listing):
+        listing.verified_at = now
+        return listing
+    if _MARKDOWN_LIST_CACHE.get(knowledge_dir) is listing:
+        del _MARKDOWN_LIST_CACHE[knowledge_dir]
+    return _markdown_listing(knowledge_dir)
+
+
+def _dir_mtimes_unchanged(dir_mtimes: dict[str, int]) -> bool:
+    for directory, mtime_ns in dir_mtimes.items():
+        try:
+            if os.stat(directory).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _file_stats_unchanged(listing: _MarkdownListing) -> bool:
+    for path, expected in zip(listing.paths, listing.file_stats, strict=True):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (stat.st_mtime_ns, stat.st_size) != expected:
+            return False
+    return True
 
 
 def search_knowledge_markdown(
@@ -87,35 +232,82 @@ def search_knowledge_markdown(
     project_root: Path,
     max_hits: int,
 ) -> list[KnowledgeMatch]:
-    """Search knowledge markdown files with rg and return line-level hits."""
+    """Search knowledge markdown files and return line-level hits.
+
+    Small knowledge folders are scanned in-process; larger ones use rg, with the
+    in-process scan as a fallback when rg is unavailable.
+    """
     if not query.strip():
         return []
     if not knowledge_dir.exists():
         return []
-    pattern = build_knowledge_pattern(query)
-    if not pattern:
+    terms = _knowledge_terms(query)
+    if not terms:
+        return []
+    pattern = _terms_to_pattern(terms)
+
+    listing = _checked_markdown_listing(knowledge_dir)
+    cache_key = (str(knowledge_dir), str(project_root), pattern, max_hits)
+    with _SEARCH_CACHE_LOCK:
+        cached = _SEARCH_CACHE.get(cache_key)
+        if cached is not None and cached[0] is listing:
+            _SEARCH_CACHE.move_to_end(cache_key)
+            return list(cached[1])
+
+    matches = _search_uncached(
+        pattern=pattern,
+        terms=terms,
+        knowledge_dir=knowledge_dir,
+        project_root=project_root,
+        max_hits=max_hits,
+    )
+    if matches is None:
         return []
+    with _SEARCH_CACHE_LOCK:
+        _SEARCH_CACHE[cache_key] = (listing, matches)
+        _SEARCH_CACHE.move_to_end(cache_key)
+        while len(_SEARCH_CACHE) > _SEARCH_CACHE_MAX_ENTRIES:
+            _SEARCH_CACHE.popitem(last=False)
+    return list(matches)
+
+
+def _search_uncached(
+    *,
+    pattern: str,
+    terms: list[str],
+    knowledge_dir: Path,
+    project_root: Path,
+    max_hits: int,
+) -> list[KnowledgeMatch] | None:
+    """Run the search; None means rg failed and the empty result must not be cached."""
+    if _is_small_corpus(knowledge_dir):
+        return _python_search(
+            pattern=pattern,
+            terms=terms,
+            knowledge_dir=knowledge_dir,
+            project_root=project_root,
+            max_hits=max_hits,
+        )
 
     try:
-        output = _run_rg_search(
+        return _run_rg_search(
             pattern=pattern,
             knowledge_dir=knowledge_dir,
             project_root=project_root,
+            max_hits=max_hits,
         )
-        return _parse_rg_output(output, knowledge_dir=knowledge_dir, project_root=project_root)[
-            :max_hits
-        ]
     except FileNotFoundError:
         logger.info("rg command is unavailable; falling back to Python search")
     except subprocess.TimeoutExpired:
         logger.warning("rg knowledge search timed out")
-        return []
+        return None
     except Exception:
         logger.exception("Knowledge search via rg failed")
-        return []
+        return None
 
-    return _fallback_python_search(
+    return _python_search(
         pattern=pattern,
+        terms=terms,
         knowledge_dir=knowledge_dir,
         project_root=project_root,
         max_hits=max_hits,
@@ -124,32 +316,42 @@ def search_knowledge_markdown(
 
 def build_knowledge_pattern(query: str) -> str:
     """Build a safe OR pattern from query terms for ripgrep usage."""
+    return _terms_to_pattern(_knowledge_terms(query))
+
+
+def _knowledge_terms(query: str) -> list[str]:
+    """Pick up to four distinct, meaningful literal terms from the query."""
+    stripped = query.strip()
+    drop_short_ascii = len(stripped) > 2
     terms: list[str] = []
     seen: set[str] = set()
-    for token in re.split(r"\s+", query.strip()):
-        normalized = token.strip().strip("`'\".,!?():;[]{}")
+    for token in stripped.split():
+        normalized = token.strip(_TOKEN_EDGE_PUNCTUATION)
         if not normalized:
             continue
-        lowered = normalized.lower()
-        if normalized.isascii() and lowered in _EN_STOPWORDS:
-            continue
+        is_ascii = normalized.isascii()
         # Keep meaningful single-character CJK tokens while skipping noisy ASCII one-letter tokens.
-        if len(normalized) < 2 and len(query.strip()) > 2 and normalized.isascii():
+        if is_ascii and drop_short_ascii and len(normalized) < 2:
             continue
-        if lowered in seen:
+        lowered = normalized.lower()
+        if lowered in seen or (is_ascii and lowered in _EN_STOPWORDS):
             continue
         terms.append(normalized)
         seen.add(lowered)
         if len(terms) >= 4:
             break
-    if not terms and query.strip():
-        terms = [query.strip()]
+    if not terms and stripped:
+        terms = [stripped]
+    return terms
+
+
+def _terms_to_pattern(terms: list[str]) -> str:
     return "|".join(_to_rg_pattern_term(term) for term in terms)
 
 
 def _to_rg_pattern_term(term: str) -> str:
     escaped = re.escape(term)
-    if term.isascii() and re.fullmatch(r"[A-Za-z0-9_]+", term):
+    if term.isascii() and _WORD_TERM_RE.fullmatch(term):
         return rf"\b{escaped}\b"
     return escaped
 
@@ -174,78 +376,231 @@ def build_knowledge_preamble(files: list[str], matches: list[KnowledgeMatch]) ->
     return "\n".join(lines)
 
 
-def _run_rg_search(*, pattern: str, knowledge_dir: Path, project_root: Path) -> str:
-    result = subprocess.run(
+def _run_rg_search(
+    *, pattern: str, knowledge_dir: Path, project_root: Path, max_hits: int
+) -> list[KnowledgeMatch]:
+    """Stream rg output and stop the process as soon as max_hits are parsed."""
+    process = subprocess.Popen(
         [
             "rg",
-            "-n",
-            "--no-heading",
+            "--json",
             "-S",
+            "-m",
+            str(max_hits),
             "--glob",
             "*.md",
+            # The in-process scan cannot evaluate ignore files, so neither path reads them.
+            "--no-ignore",
             pattern,
-            str(knowledge_dir),
+            str(knowledge_dir.resolve()),
         ],
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
         text=True,
-        timeout=5,
-        check=False,
+        encoding="utf-8",
+        errors="replace",
         cwd=str(project_root.resolve()),
     )
-    # rg returns 0 for matches, 1 for no matches.
-    if result.returncode not in {0, 1}:
-        logger.warning("rg returned non-zero status: %s", result.returncode)
-    return result.stdout
+    stdout = cast(IO[str], process.stdout)
+    timed_out = threading.Event()
+
+    def _kill_on_timeout() -> None:
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(_RG_TIMEOUT_SECONDS, _kill_on_timeout)
+    timer.start()
+    try:
+        matches = _parse_rg_output(
+            stdout,
+            knowledge_dir=knowledge_dir,
+            project_root=project_root,
+            max_hits=max_hits,
+        )
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            # Enough hits were collected; the rest of rg's output is not needed.
+            process.kill()
+        process.wait()
+        stdout.close()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(process.args, _RG_TIMEOUT_SECONDS)
+    # rg returns 0 for matches, 1 for no matches; kills after max_hits are expected.
+    if len(matches) < max_hits and process.returncode not in {0, 1}:
+        logger.warning("rg returned non-zero status: %s", process.returncode)
+    return matches
 
 
 def _parse_rg_output(
-    output: str, *, knowledge_dir: Path, project_root: Path
+    lines: Iterable[str], *, knowledge_dir: Path, project_root: Path, max_hits: int
 ) -> list[KnowledgeMatch]:
+    """Parse ``rg --json`` output into matches, stopping at max_hits."""
     matches: list[KnowledgeMatch] = []
-    root = project_root.resolve()
-    knowledge_root = knowledge_dir.resolve()
+    root = str(project_root.resolve())
+    knowledge_prefix = str(knowledge_dir.resolve()) + os.sep
 
-    for raw_line in output.splitlines():
-        parts = raw_line.split(":", 2)
-        if len(parts) != 3:
-            continue
-        raw_path, raw_line_no, snippet = parts
+    for raw_line in lines:
         try:
-            line_no = int(raw_line_no)
-        except ValueError:
+            record = json.loads(raw_line)
+            if record.get("type") != "match":
+                # begin/end/context/summary records carry no hit.
+                continue
+            data = record["data"]
+            raw_path = data["path"]["text"]
+            line_no = int(data["line_number"])
+            snippet = data["lines"].get("text", "")
+        except (ValueError, KeyError, TypeError):
+            # Non-UTF-8 paths arrive base64-encoded under "bytes"; they are skipped.
             continue
 
-        path = Path(raw_path)
-        resolved = path.resolve() if path.is_absolute() else (root / path).resolve()
-        if not is_within(resolved, knowledge_root):
+        # rg walks the resolved knowledge dir without following symlinks, so a lexical
+        # normalization is enough to keep hits inside it; no per-hit filesystem calls.
+        abs_path = os.path.normpath(os.path.join(root, raw_path))
+        if not abs_path.startswith(knowledge_prefix):
             continue
 
-        rel_path = str(resolved.relative_to(root))
+        rel_path = os.path.relpath(abs_path, root)
         matches.append(KnowledgeMatch(path=rel_path, line=line_no, snippet=snippet.strip()))
+        if len(matches) >= max_hits:
+            break
 
     return matches
 
 
-def _fallback_python_search(
+@lru_cache(maxsize=256)
+def _compile_pattern(pattern: str, flags: int) -> re.Pattern[str]:
+    """Compile a search pattern once; repeated query terms skip re-parsing."""
+    return re.compile(pattern, flags)
+
+
+@lru_cache(maxsize=256)
+def _compile_bytes_pattern(pattern: bytes, flags: int) -> re.Pattern[bytes]:
+    return re.compile(pattern, flags)
+
+
+def _is_small_corpus(knowledge_dir: Path) -> bool:
+    """Return True when the markdown under knowledge_dir is cheap to scan in-process."""
+    return _markdown_listing(knowledge_dir).total_bytes <= _IN_PROCESS_SEARCH_MAX_BYTES
+
+
+def _python_search(
     *,
     pattern: str,
+    terms: list[str],
     knowledge_dir: Path,
     project_root: Path,
     max_hits: int,
 ) -> list[KnowledgeMatch]:
-    compiled = re.compile(pattern, re.IGNORECASE)
-    root = project_root.resolve()
+    # Smart case, like rg -S: an uppercase letter in any term makes the search case-sensitive.
+    flags = 0 if any(char.isupper() for term in terms for char in term) else re.IGNORECASE
+    compiled = _compile_pattern(pattern, flags)
+    # Bytes regexes know only ASCII word characters and case, so they serve to find
+    # candidate lines; every candidate is confirmed by the same check as the line scan.
+    compiled_bytes = (
+        _compile_bytes_pattern(_candidate_bytes_pattern(terms), flags)
+        if pattern.isascii()
+        else None
+    )
+    # ASCII lines must contain one of the literal terms; the regex then confirms word
+    # boundaries. Folding first keeps e.g. a "ſ" in a term able to match an ASCII "s".
+    literals = tuple(term.translate(_TO_ASCII_CASE_FOLD).lower() for term in terms)
+    root = str(project_root.resolve())
     matches: list[KnowledgeMatch] = []
 
-    for path in sorted(knowledge_dir.rglob("*.md")):
-        if not path.is_file():
+    for path in _markdown_paths(knowledge_dir):
+        rel_path = os.path.relpath(path, root)
+        remaining = max_hits - len(matches)
+        try:
+            if compiled_bytes is not None and os.stat(path).st_size >= _MMAP_MIN_BYTES:
+                hits = _mmap_search_file(path, compiled_bytes, compiled, literals, remaining)
+            else:
+                hits = _line_search_file(path, compiled, literals, remaining)
+        except OSError:
             continue
-        rel_path = str(path.resolve().relative_to(root))
-        for index, line in enumerate(
-            path.read_text(encoding="utf-8", errors="replace").splitlines(), 1
-        ):
-            if compiled.search(line):
-                matches.append(KnowledgeMatch(path=rel_path, line=index, snippet=line.strip()))
-                if len(matches) >= max_hits:
-                    return matches
+        for line_no, snippet in hits:
+            matches.append(KnowledgeMatch(path=rel_path, line=line_no, snippet=snippet))
+        if len(matches) >= max_hits:
+            return matches
     return matches
+
+
+def _line_search_file(
+    path: str, compiled: re.Pattern[str], literals: tuple[str, ...], max_hits: int
+) -> list[tuple[int, str]]:
+    hits: list[tuple[int, str]] = []
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        # Stream lines so large files are never held in memory whole.
+        for index, line in enumerate(handle, 1):
+            if _line_matches(line, compiled, literals):
+                hits.append((index, line.strip()))
+                if len(hits) >= max_hits:
+                    break
+    return hits
+
+
+def _line_matches(line: str, compiled: re.Pattern[str], literals: tuple[str, ...]) -> bool:
+    # Substring tests are far cheaper than the alternation; most lines fail them. They
+    # agree with IGNORECASE only on ASCII text: "claſs" matches "class" but does not
+    # contain it after lower(), so other lines go straight to the regex.
+    if line.isascii():
+        lowered = line.lower()
+        if not any(literal in lowered for literal in literals):
+            return False
+    return compiled.search(line) is not None
+
+
+def _mmap_search_file(
+    path: str,
+    candidates: re.Pattern[bytes],
+    compiled: re.Pattern[str],
+    literals: tuple[str, ...],
+    max_hits: int,
+) -> list[tuple[int, str]]:
+    """Scan a file as bytes, decoding only the candidate lines."""
+    hits: list[tuple[int, str]] = []
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_no = 1
+        counted_to = 0
+        match = candidates.search(mm)
+        while match is not None:
+            start = match.start()
+            # mmap has no count(); each slice is copied once as the scan moves forward.
+            line_no += mm[counted_to:start].count(b"\n")
+            line_start = mm.rfind(b"\n", 0, start) + 1
+            line_end = mm.find(b"\n", start)
+            if line_end < 0:
+                line_end = len(mm)
+            line = mm[line_start:line_end].decode("utf-8", "replace")
+            if _line_matches(line, compiled, literals):
+                hits.append((line_no, line.strip()))
+                if len(hits) >= max_hits:
+                    break
+            if line_end >= len(mm):
+                break
+            # Resume on the next line so one line yields at most one hit.
+            counted_to = line_end + 1
+            line_no += 1
+            match = candidates.search(mm, counted_to)
+    return hits
+
+
+def _candidate_bytes_pattern(terms: list[str]) -> bytes:
+    """Match every line the str pattern can match for ASCII terms, and possibly more.
+
+    Word boundaries are dropped because bytes regexes treat non-ASCII letters as
+    non-word characters, and the non-ASCII characters that str IGNORECASE folds to
+    ASCII letters are spelled out as UTF-8 alternatives.
+    """
+    parts: list[str] = []
+    for term in terms:
+        pieces: list[str] = []
+        for char in term:
+            extras = _ASCII_CASE_FOLD_EXTRAS.get(char.lower())
+            if extras:
+                pieces.append("(?:" + "|".join((re.escape(char), *extras)) + ")")
+            else:
+                pieces.append(re.escape(char))
+        parts.append("".join(pieces))
+    return "|".join(parts).encode("utf-8")
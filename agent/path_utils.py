@@ -2,9 +2,18 @@
 
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 
 def is_within(path: Path, root: Path) -> bool:
-    """Return True when path is equal to or inside root."""
-    return path == root or root in path.parents
+    """Return True when path is equal to or inside root.
+
+    Both paths must already be resolved; this is a lexical check.
+    """
+    path_str = os.path.normcase(os.fspath(path))
+    root_str = os.path.normcase(os.fspath(root))
+    if path_str == root_str:
+        return True
+    prefix = root_str if root_str.endswith(os.sep) else root_str + os.sep
+    return path_str.startswith(prefix)
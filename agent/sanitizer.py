@@ -11,6 +11,8 @@ import os
 import re
 
 _HOME = os.path.expanduser("~")
+# Paths under this prefix are shown project-relative; see set_project_root().
+_PROJECT_ROOT_PREFIX = os.getcwd() + "/"
 
 # sk-ant-... pattern (Anthropic API keys)
 _RE_ANTHROPIC_KEY = re.compile(r"sk-ant-[A-Za-z0-9\-_]{20,}")
@@ -19,17 +21,33 @@ _RE_ANTHROPIC_KEY = re.compile(r"sk-ant-[A-Za-z0-9\-_]{20,}")
 _RE_LONG_TOKEN = re.compile(r"(?<![A-Za-z0-9/])[A-Za-z0-9+/\-_]{40,}(?:={0,2})(?![A-Za-z0-9/])")
 
 # Absolute paths: /Users/..., /home/..., /tmp/..., /var/..., /private/...
+_ABS_PATH_ROOTS = ("/Users", "/home", "/tmp", "/var", "/private", "/opt", "/etc")
 _RE_ABS_PATH = re.compile(
-    r"(?:/Users|/home|/tmp|/var|/private|/opt|/etc)"
+    rf"(?:{'|'.join(_ABS_PATH_ROOTS)})"
     r"(?:/[^\s`\"')\]}>,:;]+)+"
 )
+# Every path match contains one of these literals; cheap to test with str.__contains__.
+_ABS_PATH_PREFIXES = tuple(root + "/" for root in _ABS_PATH_ROOTS)
 
 # .claude internal paths (tool-results, projects, etc.)
 _RE_CLAUDE_INTERNAL = re.compile(r"\.claude/projects/[^\s`\"')\]}>,:;]+")
 
+# Necessary condition for _RE_LONG_TOKEN without its lookarounds; far cheaper to scan.
+_LONG_TOKEN_MIN_LEN = 40
+_RE_TOKEN_RUN = re.compile(rf"[A-Za-z0-9+/\-_]{{{_LONG_TOKEN_MIN_LEN}}}")
+_MIN_REDACTABLE_LEN = len("/tmp/x")
+
+
+# Characters no redaction pattern can match across; safe places to split a stream.
+_STREAM_BOUNDARY_CHARS = frozenset(" \t\n\r\f\v`\"')]}>,:;")
+
 
 def sanitize(text: str) -> str:
     """Redact secrets and system paths from agent output."""
+    if not _may_need_redaction(text):
+        return text
+    # Sequential passes: each later pattern sees the earlier replacements, so a token
+    # that follows a redacted key, or a path around an internal path, is still caught.
     text = _RE_ANTHROPIC_KEY.sub("[REDACTED_API_KEY]", text)
     text = _RE_CLAUDE_INTERNAL.sub("[internal-path]", text)
     text = _RE_LONG_TOKEN.sub("[REDACTED_TOKEN]", text)
@@ -37,12 +55,86 @@ def sanitize(text: str) -> str:
     return text
 
 
+def set_project_root(project_root: str | os.PathLike[str]) -> None:
+    """Show paths under project_root as relative (defaults to the CWD at import)."""
+    global _PROJECT_ROOT_PREFIX
+    _PROJECT_ROOT_PREFIX = os.fspath(project_root).rstrip("/") + "/"
+
+
+def _may_need_redaction(text: str) -> bool:
+    """Cheap pre-check; most output has nothing to redact and skips the regex passes."""
+    # Shortest possible match is an absolute path such as "/tmp/x"; most streamed
+    # fragments are shorter than that.
+    if len(text) < _MIN_REDACTABLE_LEN:
+        return False
+    if "sk-ant-" in text:
+        return True
+    # Substring tests only: running _RE_ABS_PATH here would scan text that needs
+    # redaction twice. Path patterns need a slash, long tokens 40 chars.
+    if "/" in text and (
+        ".claude/projects/" in text or any(prefix in text for prefix in _ABS_PATH_PREFIXES)
+    ):
+        return True
+    return len(text) >= _LONG_TOKEN_MIN_LEN and _RE_TOKEN_RUN.search(text) is not None
+
+
+class StreamSanitizer:
+    """Apply ``sanitize()`` to text that arrives in arbitrarily split chunks.
+
+    Sanitizing each chunk on its own misses secrets split across chunk
+    boundaries. Text up to the last point no pattern can span is emitted; the
+    rest is held back until a later chunk or ``flush()`` completes it.
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        """Return the sanitized text that can be emitted after adding text."""
+        cut = _stream_cut(self._pending, text)
+        if cut < 0:
+            self._pending += text
+            return ""
+        ready = self._pending + text[:cut]
+        self._pending = text[cut:]
+        return sanitize(ready)
+
+    def flush(self) -> str:
+        """Return any held-back text, sanitized."""
+        ready, self._pending = self._pending, ""
+        return sanitize(ready) if ready else ""
+
+
+def _stream_cut(pending: str, text: str) -> int:
+    """Return how much of text can be emitted after pending, or -1 to hold it all.
+
+    A split is safe after a boundary character, or after a non-ASCII character
+    when no slash precedes it in the current run: keys and tokens are ASCII-only
+    and every path pattern needs a slash before it can span non-ASCII text.
+    Japanese replies rarely contain boundary characters, so the second rule keeps
+    them streaming.
+    """
+    boundary = -1
+    for index in range(len(text) - 1, -1, -1):
+        if text[index] in _STREAM_BOUNDARY_CHARS:
+            boundary = index
+            break
+    start = boundary + 1
+    # Pending text never contains a boundary character, so it belongs to this run.
+    if boundary < 0 and "/" in pending:
+        return -1
+    slash = text.find("/", start)
+    for index in range((len(text) if slash < 0 else slash) - 1, start - 1, -1):
+        if text[index] > "\x7f":
+            return index + 1
+    return start if boundary >= 0 else -1
+
+
 def _redact_abs_path(match: re.Match[str]) -> str:
     """Replace absolute path with project-relative or redacted form."""
     path = match.group(0)
-    project_root = os.getcwd()
-    if path.startswith(project_root + "/"):
-        return path[len(project_root) + 1 :]
+    if path.startswith(_PROJECT_ROOT_PREFIX):
+        return path[len(_PROJECT_ROOT_PREFIX) :]
     if path.startswith(_HOME):
         return "~" + path[len(_HOME) :]
     return "[redacted-path]"
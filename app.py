@@ -2,15 +2,24 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import re
+import time
+from collections import deque
 from datetime import UTC, datetime
 from typing import Any
 from uuid import uuid4
 
 import streamlit as st
 from agent.async_bridge import AsyncBridge
-from agent.attachments import cleanup_all_uploads, persist_attachments
+from agent.attachments import (
+    AttachmentPersistResult,
+    persist_attachments,
+    schedule_cleanup_all_uploads,
+    schedule_startup_cleanup_once,
+)
 from agent.client import ClaudeChatAgent
 from agent.context_builder import PromptContextBuilder
 from agent.knowledge import (
@@ -19,7 +28,7 @@ from agent.knowledge import (
     resolve_knowledge_dir,
     search_knowledge_markdown,
 )
-from agent.sanitizer import sanitize
+from agent.sanitizer import StreamSanitizer, sanitize, set_project_root
 from config.settings import (
     APP_ICON,
     APP_LOG_FORMAT,
@@ -35,16 +44,34 @@ from config.settings import (
     KNOWLEDGE_MAX_HITS,
     PROJECT_ROOT,
     REQUESTS_PER_MINUTE_LIMIT,
+    STREAM_FLUSH_INTERVAL_MS,
+    STREAMING_RAW_TEXT,
     UI_LOCALE,
     get_auth_compliance_warnings,
     get_auth_description,
     validate_runtime_environment,
 )
+from config.ui_assets import CUSTOM_CSS_PAYLOAD, IME_FIX_JS_PAYLOAD
 from streamlit.elements.widgets.chat import ChatInputValue
 
 logger = logging.getLogger(__name__)
-_LOGGING_CONFIGURED = False
-_UPLOADS_CLEANED_AT_STARTUP = False
+# Redact paths relative to the project, whatever directory Streamlit was launched from.
+set_project_root(PROJECT_ROOT)
+# Streamlit re-executes this script in a fresh namespace on every rerun, so whether
+# logging is configured is read back from the root logger, which lives for the process.
+_LOG_HANDLER_NAME = "app"
+
+# Each placeholder update is a websocket message and a full client re-render, so renders
+# are capped at one per interval and skipped until a few new characters are buffered.
+_STREAM_RENDER_INTERVAL_SECONDS = STREAM_FLUSH_INTERVAL_MS / 1000
+_STREAM_RENDER_MIN_CHARS = 8
+
+# Every rerun replays the transcript and keeps it in session memory, so long-lived tabs
+# keep only the most recent messages. Even, because messages are appended in pairs.
+_MAX_UI_HISTORY_MESSAGES = 200
+
+# A fence line: a run of three or more backticks or tildes, then an optional info string.
+_FENCE_RE = re.compile(r"(`{3,}|~{3,})(.*)")
 
 
 _TOOL_LABELS: dict[str, dict[str, str]] = {
@@ -95,6 +122,7 @@ _TEXTS: dict[str, dict[str, str]] = {
         "attachments_error": "Attachment setup error: {details}",
         "attachment_only_prompt": "Please analyze the attached files and summarize key points.",
         "knowledge_error": "Knowledge setup error: {details}",
+        "history_trimmed": "{count} earlier messages are no longer shown.",
     },
     "ja": {
         "sidebar_title": "プロジェクト設定",
@@ -118,117 +146,51 @@ _TEXTS: dict[str, dict[str, str]] = {
         "attachments_error": "添付設定エラー: {details}",
         "attachment_only_prompt": "添付ファイルを解析して、要点を要約してください。",
         "knowledge_error": "Knowledge 設定エラー: {details}",
+        "history_trimmed": "以前のメッセージ {count} 件は表示されていません。",
     },
 }
 
-_CUSTOM_CSS = """
-<style>
-[data-testid="stChatMessage"] h1 { font-size: 1.4rem !important; }
-[data-testid="stChatMessage"] h2 { font-size: 1.2rem !important; }
-[data-testid="stChatMessage"] h3 { font-size: 1.05rem !important; }
-[data-testid="stChatMessage"] p { margin-bottom: 0.4em !important; }
-.stMainBlockContainer { padding-top: 1.5rem !important; }
-[data-testid="stStatusWidget"] { display: none !important; }
-</style>
-"""
-
-_IME_FIX_JS = """
-<script>
-(function() {
-    var VERSION = 4;
-    var doc = window.parent.document;
-    if (doc._imeFixCleanup) doc._imeFixCleanup();
-    if (doc._imeFixVersion === VERSION) return;
-    doc._imeFixVersion = VERSION;
-
-    var composing = false;
-    var compositionStartedAt = 0;
-    var lastComposedAt = 0;
-    var JUST_COMPOSED_WINDOW_MS = 320;
-    var COMPOSITION_STALE_MS = 5000;
-
-    function nowMs() {
-        return (window.performance && window.performance.now)
-            ? window.performance.now() : Date.now();
-    }
-    function isChatInput(e) {
-        return e.target && e.target.closest &&
-               e.target.closest('[data-testid="stChatInput"]');
-    }
-    function onCompositionStart(e) {
-        if (!isChatInput(e)) return;
-        composing = true;
-        compositionStartedAt = nowMs();
-    }
-    function onCompositionEnd(e) {
-        if (!isChatInput(e)) return;
-        var text = (typeof e.data === 'string') ? e.data : '';
-        if (text.length > 0) { lastComposedAt = nowMs(); }
-        composing = false;
-    }
-    function onFocusout(e) {
-        if (!isChatInput(e)) return;
-        composing = false;
-    }
-    function onKeydown(e) {
-        if (e.key !== 'Enter' || e.shiftKey || !isChatInput(e)) return;
-        var now = nowMs();
-        if (composing && (now - compositionStartedAt) > COMPOSITION_STALE_MS) {
-            composing = false;
-        }
-        var keyCode = e.keyCode || e.which || 0;
-        var imeProcessKey = keyCode === 229 || e.key === 'Process';
-        var recentlyComposed = (now - lastComposedAt) < JUST_COMPOSED_WINDOW_MS;
-        if (imeProcessKey || composing || recentlyComposed) {
-            e.preventDefault();
-            e.stopPropagation();
-            e.stopImmediatePropagation();
-            if (recentlyComposed) { lastComposedAt = 0; }
-        }
-    }
-
-    doc.addEventListener('compositionstart', onCompositionStart, true);
-    doc.addEventListener('compositionend', onCompositionEnd, true);
-    doc.addEventListener('focusout', onFocusout, true);
-    doc.addEventListener('keydown', onKeydown, true);
-
-    doc._imeFixCleanup = function() {
-        doc.removeEventListener('compositionstart', onCompositionStart, true);
-        doc.removeEventListener('compositionend', onCompositionEnd, true);
-        doc.removeEventListener('focusout', onFocusout, true);
-        doc.removeEventListener('keydown', onKeydown, true);
-        composing = false;
-        lastComposedAt = 0;
-        delete doc._imeFixVersion;
-    };
-})();
-</script>
-"""
+
+def _resolve_locale_table(table: dict[str, dict[str, str]], locale: str) -> dict[str, str]:
+    """Merge a locale's entries over English so lookups need a single get()."""
+    return {**table["en"], **table.get(locale, {})}
+
+
+# UI_LOCALE is fixed at startup, so the active tables are resolved once.
+_ACTIVE_TOOL_LABELS = _resolve_locale_table(_TOOL_LABELS, UI_LOCALE)
+_ACTIVE_TEXTS = _resolve_locale_table(_TEXTS, UI_LOCALE)
 
 
 class _JsonFormatter(logging.Formatter):
     """Minimal JSON log formatter for production-friendly logs."""
 
+    # json.dumps() with non-default options builds a new encoder on every call.
+    _encoder = json.JSONEncoder(ensure_ascii=False)
+
     def format(self, record: logging.LogRecord) -> str:
-        payload: dict[str, Any] = {
-            "timestamp": datetime.now(UTC).isoformat(),
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-        }
+        # The keys are fixed, so the object is assembled around individually encoded
+        # values instead of building a dict for the generic encoder. The layout matches
+        # JSONEncoder's default separators, so the output is unchanged.
+        encode = self._encoder.encode
+        # The record's own creation time; no extra clock read per log line.
+        timestamp = datetime.fromtimestamp(record.created, UTC).isoformat()
+        line = (
+            f'{{"timestamp": "{timestamp}", "level": {encode(record.levelname)}, '
+            f'"logger": {encode(record.name)}, "message": {encode(record.getMessage())}'
+        )
         if record.exc_info:
-            payload["exception"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+            line += f', "exception": {encode(self.formatException(record.exc_info))}'
+        return line + "}"
 
 
 def _configure_logging() -> None:
     """Configure root logger once based on environment settings."""
-    global _LOGGING_CONFIGURED
     root = logging.getLogger()
-    if _LOGGING_CONFIGURED:
+    if any(handler.get_name() == _LOG_HANDLER_NAME for handler in root.handlers):
         return
 
     handler = logging.StreamHandler()
+    handler.set_name(_LOG_HANDLER_NAME)
     if APP_LOG_FORMAT == "json":
         handler.setFormatter(_JsonFormatter())
     else:
@@ -237,64 +199,137 @@ def _configure_logging() -> None:
     root.handlers.clear()
     root.addHandler(handler)
     root.setLevel(getattr(logging, APP_LOG_LEVEL, logging.INFO))
-    _LOGGING_CONFIGURED = True
 
 
 def _tool_status_label(tool_name: str) -> str:
-    """Convert an SDK tool name to a user-friendly label."""
-    short = tool_name.split("__")[-1] if "__" in tool_name else tool_name
-    localized = _TOOL_LABELS.get(UI_LOCALE, _TOOL_LABELS["en"])
-    return localized.get(short, short)
+    """Convert an SDK tool name to a user-friendly label.
+
+    Known tools map to constant labels; only an unknown name is shown verbatim, so
+    only that fallback needs sanitizing.
+    """
+    short = tool_name.rpartition("__")[2]
+    label = _ACTIVE_TOOL_LABELS.get(short)
+    return label if label is not None else sanitize(short)
 
 
 def _msg(key: str, **kwargs: Any) -> str:
     """Return a localized UI message."""
-    localized = _TEXTS.get(UI_LOCALE, _TEXTS["en"])
-    template = localized.get(key, _TEXTS["en"].get(key, key))
-    return template.format(**kwargs)
-
-
-def _apply_stream_chunk(final_text_parts: list[str], chunk: dict[str, str]) -> bool:
-    """Append text/error chunks to the assistant response buffer."""
-    ctype = chunk.get("type")
-    content = chunk.get("content", "")
-    if ctype in {"text_delta", "text"} and content:
-        final_text_parts.append(content)
-        return True
-    if ctype == "error":
-        final_text_parts.append(f"\n\nError: {content}")
-        return True
-    return False
+    template = _ACTIVE_TEXTS.get(key, key)
+    return template.format(**kwargs) if kwargs else template
 
 
 def _initialize_session_state() -> None:
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    # Bridge and agent stay per session rather than st.cache_resource singletons: the agent
+    # owns one conversation, and a loop can only be driven by one script thread at a time.
+    # Both constructors are cheap, and AsyncBridge already reuses a process-wide loop.
     if "bridge" not in st.session_state:
         st.session_state.bridge = AsyncBridge()
     if "agent" not in st.session_state:
         st.session_state.agent = ClaudeChatAgent(project_root=PROJECT_ROOT)
+    if not st.session_state.bridge.is_alive:
+        # The SDK client's task group died with the old loop; reconnect from scratch.
+        st.session_state.agent.discard_client()
+        st.session_state.bridge.restart()
     if "attachment_session_id" not in st.session_state:
         st.session_state.attachment_session_id = uuid4().hex
     if "request_timestamps" not in st.session_state:
-        st.session_state.request_timestamps = []
+        st.session_state.request_timestamps = deque()
+    if "hidden_message_count" not in st.session_state:
+        st.session_state.hidden_message_count = 0
+
+
+def _trim_history(messages: list[dict[str, str]], *, limit: int) -> int:
+    """Drop the oldest messages beyond limit in place and return how many were dropped."""
+    excess = len(messages) - limit
+    if excess <= 0:
+        return 0
+    del messages[:excess]
+    return excess
 
 
 def _cleanup_uploads_on_startup_once() -> None:
     """Clean runtime upload artifacts once per process start."""
-    global _UPLOADS_CLEANED_AT_STARTUP
-    if _UPLOADS_CLEANED_AT_STARTUP or not ATTACHMENTS_ENABLED:
+    if not ATTACHMENTS_ENABLED:
         return
 
-    try:
-        cleanup_all_uploads(
-            project_root=PROJECT_ROOT,
-            storage_dir=ATTACHMENTS_STORAGE_DIR,
-        )
-    except (ValueError, OSError):
-        logger.exception("Startup upload cleanup failed")
+    # The once-per-process flag lives in agent.attachments; this script's globals reset
+    # on every rerun.
+    schedule_startup_cleanup_once(
+        project_root=PROJECT_ROOT,
+        storage_dir=ATTACHMENTS_STORAGE_DIR,
+        failure_message="Startup upload cleanup failed",
+    )
+
+
+def _schedule_upload_cleanup(failure_message: str) -> None:
+    """Delete upload artifacts off the script thread so the page never waits on it.
+
+    persist_attachments waits for scheduled cleanups, so they cannot delete fresh uploads.
+    """
+    schedule_cleanup_all_uploads(
+        project_root=PROJECT_ROOT,
+        storage_dir=ATTACHMENTS_STORAGE_DIR,
+        failure_message=failure_message,
+    )
+
 
-    _UPLOADS_CLEANED_AT_STARTUP = True
+class _StreamLayout:
+    """Render a streaming reply as write-once finished blocks plus a redrawn tail.
+
+    A markdown block ends at a blank line outside fenced code. Finished blocks are
+    written once into their own elements, so each render re-sends and re-parses only
+    the trailing block instead of the whole reply. The caller replaces the layout with
+    the complete reply as a single markdown element once streaming ends.
+    """
+
+    def __init__(self, placeholder: Any, *, raw_text: bool) -> None:
+        layout = placeholder.container()
+        self._blocks = layout.container()
+        self._tail = layout.empty()
+        self._raw_text = raw_text
+        # Offset of text already written as finished blocks.
+        self._emitted = 0
+        # Offset of the first line not yet classified, and the fence it is inside, if any.
+        self._scanned = 0
+        self._fence = ""
+
+    def render(self, text: str) -> None:
+        block_end = self._emitted
+        while (newline := text.find("\n", self._scanned)) != -1:
+            line = text[self._scanned : newline].lstrip()
+            if self._fence:
+                if _closes_fence(line, self._fence):
+                    self._fence = ""
+            elif not line:
+                block_end = newline + 1
+            elif match := _FENCE_RE.match(line):
+                fence, info = match.groups()
+                # A backtick fence's info string cannot contain backticks (CommonMark).
+                if fence[0] == "~" or "`" not in info:
+                    self._fence = fence
+            self._scanned = newline + 1
+        if block_end > self._emitted:
+            self._write(self._blocks, text[self._emitted : block_end])
+            self._emitted = block_end
+        self._write(self._tail, text[self._emitted :] + " ▌")
+
+    def _write(self, target: Any, text: str) -> None:
+        # Partial replies can skip the browser's markdown parse entirely in raw mode.
+        if self._raw_text:
+            target.text(text)
+        else:
+            target.markdown(text)
+
+
+def _closes_fence(line: str, fence: str) -> bool:
+    """Return True when line closes fence: same character, at least as long, no info."""
+    match = _FENCE_RE.match(line)
+    if match is None:
+        return False
+    closing, rest = match.groups()
+    return closing[0] == fence[0] and len(closing) >= len(fence) and not rest.strip()
 
 
 async def _stream_response(
@@ -304,41 +339,79 @@ async def _stream_response(
     response_placeholder: Any,
 ) -> str:
     """Fetch and progressively render a single assistant response."""
-    final_text_parts: list[str] = []
+    # Appending to a str held by one reference is amortized O(1) in CPython.
+    buffer = ""
+    rendered_len = 0
+    text_sanitizer = StreamSanitizer()
+    # The caller shows the "thinking" status before streaming starts.
+    status_visible = True
+    last_render_at = float("-inf")
+    layout = _StreamLayout(response_placeholder, raw_text=STREAMING_RAW_TEXT)
 
     async for chunk in agent.send_message_streaming(prompt):
-        ctype = chunk.get("type")
-        content = chunk.get("content", "")
-        safe_content = sanitize(content)
-
-        if _apply_stream_chunk(final_text_parts, {"type": ctype or "", "content": safe_content}):
-            status_placeholder.empty()
-            response_placeholder.markdown("".join(final_text_parts) + " ▌")
-        elif ctype == "tool_use":
-            label = _tool_status_label(safe_content)
-            status_placeholder.status(_msg("running_tool", label=label), state="running")
-        elif ctype == "tool_result":
-            status_placeholder.status(_msg("thinking"), state="running")
-
-    if not final_text_parts:
-        final_text_parts.append(_msg("no_response"))
+        # "type" is always present; "content" is optional (e.g. on some done chunks).
+        ctype = chunk["type"]
+        # Text deltas are nearly every chunk, so they are tested first.
+        if ctype == "text_delta" or ctype == "text":
+            added = text_sanitizer.feed(chunk.get("content", ""))
+        elif ctype == "tool_use" or ctype == "tool_result":
+            # A tool call ends the current run of text; release what was held back and
+            # show it while the tool runs, regardless of the render throttle.
+            buffer += text_sanitizer.flush()
+            if len(buffer) > rendered_len:
+                layout.render(buffer)
+                rendered_len = len(buffer)
+            if ctype == "tool_use":
+                label = _tool_status_label(chunk.get("content", ""))
+                status_placeholder.status(_msg("running_tool", label=label), state="running")
+            else:
+                status_placeholder.status(_msg("thinking"), state="running")
+            status_visible = True
+            continue
+        else:
+            added = text_sanitizer.flush()
+            if ctype == "error":
+                # Of the remaining chunks only errors reach the transcript; done payloads
+                # are never displayed, so they skip sanitizing.
+                added += f"\n\nError: {sanitize(chunk.get('content', ''))}"
+        if added:
+            buffer += added
+            now = time.monotonic()
+            if (
+                now - last_render_at >= _STREAM_RENDER_INTERVAL_SECONDS
+                and len(buffer) - rendered_len >= _STREAM_RENDER_MIN_CHARS
+            ):
+                if status_visible:
+                    status_placeholder.empty()
+                    status_visible = False
+                layout.render(buffer)
+                last_render_at = now
+                rendered_len = len(buffer)
+
+    buffer += text_sanitizer.flush()
+    if not buffer:
+        buffer = _msg("no_response")
 
     status_placeholder.empty()
-    return "".join(final_text_parts)
+    return buffer
 
 
 def _inject_static_assets() -> None:
-    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
-    st.components.v1.html(_IME_FIX_JS, height=0)
+    st.markdown(CUSTOM_CSS_PAYLOAD, unsafe_allow_html=True)
+    st.components.v1.html(IME_FIX_JS_PAYLOAD, height=0)
 
 
-def _build_prompt_context(
+async def _build_prompt_context(
     prompt: str,
     uploaded_files: list[Any],
     *,
     attachment_session_id: str,
 ) -> tuple[str, list[str], list[str]]:
-    """Build final prompt with optional knowledge and attachment context."""
+    """Build final prompt with optional knowledge and attachment context.
+
+    The knowledge search and attachment persistence are independent disk work, so
+    they run concurrently in worker threads instead of back to back.
+    """
     warnings: list[str] = []
     attachment_names: list[str] = []
 
@@ -347,55 +420,85 @@ def _build_prompt_context(
         max_chars=CONTEXT_MAX_CHARS,
     )
 
-    if KNOWLEDGE_ENABLED:
-        try:
-            knowledge_dir = resolve_knowledge_dir(PROJECT_ROOT, KNOWLEDGE_DIR)
-            knowledge_files = list_knowledge_markdown_files(knowledge_dir, PROJECT_ROOT)
-            knowledge_matches = search_knowledge_markdown(
-                prompt,
-                knowledge_dir=knowledge_dir,
-                project_root=PROJECT_ROOT,
-                max_hits=KNOWLEDGE_MAX_HITS,
-            )
-            builder.add_knowledge_preamble(
-                build_knowledge_preamble(knowledge_files, knowledge_matches)
-            )
-        except ValueError as exc:
-            warnings.append(_msg("knowledge_error", details=exc))
+    knowledge_result, attachment_result = await asyncio.gather(
+        asyncio.to_thread(_load_knowledge_preamble, prompt) if KNOWLEDGE_ENABLED else _skip(),
+        (
+            asyncio.to_thread(_persist_uploaded_files, uploaded_files, attachment_session_id)
+            if ATTACHMENTS_ENABLED and uploaded_files
+            else _skip()
+        ),
+        return_exceptions=True,
+    )
 
-    if ATTACHMENTS_ENABLED and uploaded_files:
-        try:
-            result = persist_attachments(
-                uploaded_files,
-                project_root=PROJECT_ROOT,
-                storage_dir=ATTACHMENTS_STORAGE_DIR,
-                session_id=attachment_session_id,
-                allowed_extensions=ATTACHMENTS_ALLOWED_EXTENSIONS,
-                max_file_bytes=ATTACHMENTS_MAX_FILE_BYTES,
-            )
-            builder.add_attachments(result.attachments)
-            warnings.extend(result.warnings)
-            attachment_names = [attachment.filename for attachment in result.attachments]
-        except ValueError as exc:
-            warnings.append(_msg("attachments_error", details=exc))
+    if isinstance(knowledge_result, ValueError):
+        warnings.append(_msg("knowledge_error", details=knowledge_result))
+    elif isinstance(knowledge_result, BaseException):
+        raise knowledge_result
+    elif knowledge_result is not None:
+        builder.add_knowledge_preamble(knowledge_result)
+
+    if isinstance(attachment_result, ValueError):
+        warnings.append(_msg("attachments_error", details=attachment_result))
+    elif isinstance(attachment_result, BaseException):
+        raise attachment_result
+    elif attachment_result is not None:
+        builder.add_attachments(attachment_result.attachments)
+        warnings.extend(attachment_result.warnings)
+        attachment_names = [attachment.filename for attachment in attachment_result.attachments]
 
     return builder.build(), warnings, attachment_names
 
 
+async def _skip() -> None:
+    """Placeholder for a disabled _build_prompt_context stage."""
+    return None
+
+
+def _load_knowledge_preamble(prompt: str) -> str:
+    """Search the knowledge directory and format the preamble for prompt."""
+    knowledge_dir = resolve_knowledge_dir(PROJECT_ROOT, KNOWLEDGE_DIR)
+    knowledge_files = list_knowledge_markdown_files(knowledge_dir, PROJECT_ROOT)
+    knowledge_matches = search_knowledge_markdown(
+        prompt,
+        knowledge_dir=knowledge_dir,
+        project_root=PROJECT_ROOT,
+        max_hits=KNOWLEDGE_MAX_HITS,
+    )
+    return build_knowledge_preamble(knowledge_files, knowledge_matches)
+
+
+def _persist_uploaded_files(
+    uploaded_files: list[Any], attachment_session_id: str
+) -> AttachmentPersistResult:
+    """Persist uploads with the configured attachment settings."""
+    return persist_attachments(
+        uploaded_files,
+        project_root=PROJECT_ROOT,
+        storage_dir=ATTACHMENTS_STORAGE_DIR,
+        session_id=attachment_session_id,
+        allowed_extensions=ATTACHMENTS_ALLOWED_EXTENSIONS,
+        max_file_bytes=ATTACHMENTS_MAX_FILE_BYTES,
+    )
+
+
 def _consume_rate_limit(
     now_seconds: float,
-    timestamps: list[float],
+    timestamps: deque[float],
     *,
     limit: int,
     window_seconds: float = 60.0,
-) -> tuple[list[float], bool, int]:
-    """Return updated timestamps and whether this request should be blocked."""
-    recent = [ts for ts in timestamps if now_seconds - ts < window_seconds]
-    if len(recent) >= limit:
-        retry_after = max(1, int(window_seconds - (now_seconds - recent[0])))
-        return recent, True, retry_after
-    recent.append(now_seconds)
-    return recent, False, 0
+) -> tuple[bool, int]:
+    """Drop expired timestamps in place and report whether this request is blocked.
+
+    Timestamps are appended in order, so expired entries are always at the left.
+    """
+    while timestamps and now_seconds - timestamps[0] >= window_seconds:
+        timestamps.popleft()
+    if len(timestamps) >= limit:
+        retry_after = max(1, int(window_seconds - (now_seconds - timestamps[0])))
+        return True, retry_after
+    timestamps.append(now_seconds)
+    return False, 0
 
 
 def render_app() -> None:
@@ -411,16 +514,11 @@ def render_app() -> None:
         st.caption(_msg("sidebar_project", project=PROJECT_ROOT.name))
         st.caption(_msg("sidebar_auth", auth=get_auth_description()))
         if st.button(_msg("clear_chat"), use_container_width=True):
-            try:
-                cleanup_all_uploads(
-                    project_root=PROJECT_ROOT,
-                    storage_dir=ATTACHMENTS_STORAGE_DIR,
-                )
-            except (ValueError, OSError):
-                logger.exception("Attachment storage cleanup failed")
+            _schedule_upload_cleanup("Attachment storage cleanup failed")
             st.session_state.messages = []
+            st.session_state.hidden_message_count = 0
             st.session_state.attachment_session_id = uuid4().hex
-            st.session_state.request_timestamps = []
+            st.session_state.request_timestamps = deque()
             st.rerun()
 
     for warning in get_auth_compliance_warnings():
@@ -429,9 +527,11 @@ def render_app() -> None:
     runtime_errors = validate_runtime_environment()
     if runtime_errors:
         st.error(_msg("config_issue"))
-        for error in runtime_errors:
-            st.caption(error)
+        # One element per list; blank lines keep each entry on its own paragraph.
+        st.caption("\n\n".join(runtime_errors))
 
+    if st.session_state.hidden_message_count:
+        st.caption(_msg("history_trimmed", count=st.session_state.hidden_message_count))
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
@@ -464,12 +564,11 @@ def render_app() -> None:
     if not prompt.strip() and uploaded_files:
         prompt = _msg("attachment_only_prompt")
 
-    updated_timestamps, is_limited, retry_after = _consume_rate_limit(
-        now_seconds=datetime.now(UTC).timestamp(),
+    is_limited, retry_after = _consume_rate_limit(
+        now_seconds=time.monotonic(),
         timestamps=st.session_state.request_timestamps,
         limit=REQUESTS_PER_MINUTE_LIMIT,
     )
-    st.session_state.request_timestamps = updated_timestamps
     if is_limited:
         st.warning(
             _msg(
@@ -480,16 +579,23 @@ def render_app() -> None:
         )
         return
 
-    prompt_for_agent, context_warnings, attachment_names = _build_prompt_context(
-        prompt,
-        uploaded_files,
-        attachment_session_id=st.session_state.attachment_session_id,
+    prompt_for_agent, context_warnings, attachment_names = st.session_state.bridge.run(
+        _build_prompt_context(
+            prompt,
+            uploaded_files,
+            attachment_session_id=st.session_state.attachment_session_id,
+        )
     )
 
     user_message_text = prompt
     if attachment_names:
-        user_message_text = f"{prompt}\n\n{_msg('attachments_selected')}\n" + "\n".join(
-            f"- {filename}" for filename in attachment_names
+        user_message_text = "\n".join(
+            [
+                prompt,
+                "",
+                _msg("attachments_selected"),
+                *(f"- {filename}" for filename in attachment_names),
+            ]
         )
 
     st.session_state.messages.append({"role": "user", "content": user_message_text})
@@ -500,8 +606,9 @@ def render_app() -> None:
         status_placeholder = st.empty()
         response_placeholder = st.empty()
         status_placeholder.status(_msg("thinking"), state="running")
-        for warning in context_warnings:
-            st.caption(f"{_msg('note')}: {warning}")
+        if context_warnings:
+            note = _msg("note")
+            st.caption("\n\n".join(f"{note}: {warning}" for warning in context_warnings))
 
         try:
             response_text = st.session_state.bridge.run(
@@ -521,6 +628,9 @@ def render_app() -> None:
         response_placeholder.markdown(response_text)
 
     st.session_state.messages.append({"role": "assistant", "content": response_text})
+    st.session_state.hidden_message_count += _trim_history(
+        st.session_state.messages, limit=_MAX_UI_HISTORY_MESSAGES
+    )
 
 
 if __name__ == "__main__":
@@ -82,11 +82,10 @@ def _parse_positive_int(raw: str, *, default: int, minimum: int = 1) -> int:
 
 
 def _parse_extensions(raw: str, *, default: tuple[str, ...]) -> tuple[str, ...]:
-    parsed: list[str] = []
-    for token in raw.split(","):
-        ext = token.strip().lower().lstrip(".")
-        if ext and ext not in parsed:
-            parsed.append(ext)
+    # dict.fromkeys de-duplicates in first-seen order without rescanning the list per token.
+    parsed = dict.fromkeys(
+        ext for token in raw.split(",") if (ext := token.strip().lower().lstrip("."))
+    )
     if not parsed:
         return default
     return tuple(parsed)
@@ -135,6 +134,11 @@ REQUESTS_PER_MINUTE_LIMIT = _parse_positive_int(
     os.getenv("REQUESTS_PER_MINUTE_LIMIT", "20"),
     default=20,
 )
+STREAM_FLUSH_INTERVAL_MS = _parse_positive_int(
+    os.getenv("STREAM_FLUSH_INTERVAL_MS", "50"),
+    default=50,
+)
+STREAMING_RAW_TEXT = _parse_bool(os.getenv("STREAMING_RAW_TEXT", "0"), default=False)
 
 
 def validate_runtime_environment() -> list[str]:
@@ -0,0 +1,99 @@
+"""Static CSS and JavaScript injected into the Streamlit page."""
+
+from __future__ import annotations
+
+_CUSTOM_CSS = """
+<style>
+[data-testid="stChatMessage"] h1 { font-size: 1.4rem !important; }
+[data-testid="stChatMessage"] h2 { font-size: 1.2rem !important; }
+[data-testid="stChatMessage"] h3 { font-size: 1.05rem !important; }
+[data-testid="stChatMessage"] p { margin-bottom: 0.4em !important; }
+.stMainBlockContainer { padding-top: 1.5rem !important; }
+[data-testid="stStatusWidget"] { display: none !important; }
+</style>
+"""
+
+_IME_FIX_JS = """
+<script>
+(function() {
+    var VERSION = 4;
+    var doc = window.parent.document;
+    if (doc._imeFixCleanup) doc._imeFixCleanup();
+    if (doc._imeFixVersion === VERSION) return;
+    doc._imeFixVersion = VERSION;
+
+    var composing = false;
+    var compositionStartedAt = 0;
+    var lastComposedAt = 0;
+    var JUST_COMPOSED_WINDOW_MS = 320;
+    var COMPOSITION_STALE_MS = 5000;
+
+    function nowMs() {
+        return (window.performance && window.performance.now)
+            ? window.performance.now() : Date.now();
+    }
+    function isChatInput(e) {
+        return e.target && e.target.closest &&
+               e.target.closest('[data-testid="stChatInput"]');
+    }
+    function onCompositionStart(e) {
+        if (!isChatInput(e)) return;
+        composing = true;
+        compositionStartedAt = nowMs();
+    }
+    function onCompositionEnd(e) {
+        if (!isChatInput(e)) return;
+        var text = (typeof e.data === 'string') ? e.data : '';
+        if (text.length > 0) { lastComposedAt = nowMs(); }
+        composing = false;
+    }
+    function onFocusout(e) {
+        if (!isChatInput(e)) return;
+        composing = false;
+    }
+    function onKeydown(e) {
+        if (e.key !== 'Enter' || e.shiftKey || !isChatInput(e)) return;
+        var now = nowMs();
+        if (composing && (now - compositionStartedAt) > COMPOSITION_STALE_MS) {
+            composing = false;
+        }
+        var keyCode = e.keyCode || e.which || 0;
+        var imeProcessKey = keyCode === 229 || e.key === 'Process';
+        var recentlyComposed = (now - lastComposedAt) < JUST_COMPOSED_WINDOW_MS;
+        if (imeProcessKey || composing || recentlyComposed) {
+            e.preventDefault();
+            e.stopPropagation();
+            e.stopImmediatePropagation();
+            if (recentlyComposed) { lastComposedAt = 0; }
+        }
+    }
+
+    doc.addEventListener('compositionstart', onCompositionStart, true);
+    doc.addEventListener('compositionend', onCompositionEnd, true);
+    doc.addEventListener('focusout', onFocusout, true);
+    doc.addEventListener('keydown', onKeydown, true);
+
+    doc._imeFixCleanup = function() {
+        doc.removeEventListener('compositionstart', onCompositionStart, true);
+        doc.removeEventListener('compositionend', onCompositionEnd, true);
+        doc.removeEventListener('focusout', onFocusout, true);
+        doc.removeEventListener('keydown', onKeydown, true);
+        composing = false;
+        lastComposedAt = 0;
+        delete doc._imeFixVersion;
+    };
+})();
+</script>
+"""
+
+
+def _compact_markup(markup: str) -> str:
+    """Drop indentation and blank lines; line breaks are kept so JS parses unchanged."""
+    return "\n".join(line.strip() for line in markup.splitlines() if line.strip())
+
+
+# Streamlit removes elements a rerun does not re-emit, so the assets are sent on every
+# rerun. app.py is re-executed each time but this module is imported once, so the
+# payloads are compacted once per process.
+CUSTOM_CSS_PAYLOAD = _compact_markup(_CUSTOM_CSS)
+IME_FIX_JS_PAYLOAD = _compact_markup(_IME_FIX_JS)
@@ -2,86 +2,75 @@
 
 from __future__ import annotations
 
+import asyncio
+import itertools
+import json
+import logging
+import sys
 import unittest
+from collections import deque
+from collections.abc import AsyncIterator
 from pathlib import Path
-from unittest.mock import patch
+from typing import Any, cast
+from unittest.mock import MagicMock, patch
 
 from agent.attachments import AttachmentPersistResult, StoredAttachment
+from agent.sanitizer import sanitize
 from app import (
-    _apply_stream_chunk,
+    _TEXTS,
+    _TOOL_LABELS,
     _build_prompt_context,
     _cleanup_uploads_on_startup_once,
+    _configure_logging,
     _consume_rate_limit,
+    _JsonFormatter,
     _msg,
+    _resolve_locale_table,
+    _stream_response,
+    _StreamLayout,
     _tool_status_label,
+    _trim_history,
 )
 
 
-class ApplyStreamChunkTests(unittest.TestCase):
-    """Validates the stream chunk buffering logic."""
-
-    def test_text_delta_appended_to_buffer(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "text_delta", "content": "Hi"})
-        self.assertTrue(result)
-        self.assertEqual(parts, ["Hi"])
-
-    def test_text_appended_to_buffer(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "text", "content": "Hello"})
-        self.assertTrue(result)
-        self.assertEqual(parts, ["Hello"])
-
-    def test_error_appended_with_prefix(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "error", "content": "Timeout"})
-        self.assertTrue(result)
-        self.assertEqual(parts, ["\n\nError: Timeout"])
-
-    def test_done_chunk_is_ignored(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "done", "content": "sid"})
-        self.assertFalse(result)
-        self.assertEqual(parts, [])
-
-    def test_empty_content_is_ignored(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "text_delta", "content": ""})
-        self.assertFalse(result)
-        self.assertEqual(parts, [])
-
-    def test_missing_content_key_is_safe(self) -> None:
-        parts: list[str] = []
-        result = _apply_stream_chunk(parts, {"type": "text_delta"})
-        self.assertFalse(result)
-        self.assertEqual(parts, [])
-
-    def test_multiple_chunks_accumulate(self) -> None:
-        parts: list[str] = []
-        _apply_stream_chunk(parts, {"type": "text_delta", "content": "Hel"})
-        _apply_stream_chunk(parts, {"type": "text_delta", "content": "lo"})
-        self.assertEqual(parts, ["Hel", "lo"])
+class AppHelperTests(unittest.TestCase):
+    """Validates tool labels, localization, and prompt-context assembly."""
 
     def test_tool_status_label_english(self) -> None:
-        with patch("app.UI_LOCALE", "en"):
+        with patch("app._ACTIVE_TOOL_LABELS", _resolve_locale_table(_TOOL_LABELS, "en")):
             self.assertEqual(_tool_status_label("Bash"), "Running command")
             self.assertEqual(_tool_status_label("core__Write"), "Writing file")
 
     def test_tool_status_label_japanese(self) -> None:
-        with patch("app.UI_LOCALE", "ja"):
+        with patch("app._ACTIVE_TOOL_LABELS", _resolve_locale_table(_TOOL_LABELS, "ja")):
             self.assertEqual(_tool_status_label("Bash"), "コマンド実行")
 
+    def test_tool_status_label_sanitizes_only_unknown_names(self) -> None:
+        token = "A" * 48
+        with patch("app._ACTIVE_TOOL_LABELS", _resolve_locale_table(_TOOL_LABELS, "en")):
+            with patch("app.sanitize", wraps=sanitize) as mock_sanitize:
+                self.assertEqual(_tool_status_label("Read"), "Reading file")
+                mock_sanitize.assert_not_called()
+                self.assertEqual(_tool_status_label(f"mcp__srv__{token}"), "[REDACTED_TOKEN]")
+
     def test_message_localization(self) -> None:
-        with patch("app.UI_LOCALE", "ja"):
+        with patch("app._ACTIVE_TEXTS", _resolve_locale_table(_TEXTS, "ja")):
             self.assertEqual(_msg("clear_chat"), "チャットをクリア")
 
+    def test_unknown_locale_falls_back_to_english(self) -> None:
+        with patch("app._ACTIVE_TEXTS", _resolve_locale_table(_TEXTS, "fr")):
+            self.assertEqual(_msg("running_tool", label="X"), "Running X...")
+            self.assertEqual(_msg("missing_key"), "missing_key")
+
     def test_build_prompt_context_without_knowledge_or_attachments(self) -> None:
         with patch("app.KNOWLEDGE_ENABLED", False):
             with patch("app.ATTACHMENTS_ENABLED", False):
-                prompt, warnings, attachment_names = _build_prompt_context(
-                    "hello",
-                    [],
-                    attachment_session_id="test-session",
+                prompt, warnings, attachment_names = asyncio.run(
+                    _build_prompt_context(
+                        "hello",
+                        [],
+                        attachment_session_id="test-session",
+                    )
                 )
 
         self.assertIn("[USER_MESSAGE]", prompt)
@@ -117,10 +106,12 @@ class ApplyStreamChunkTests(unittest.TestCase):
                 ),
             ),
         ):
-            prompt, warnings, attachment_names = _build_prompt_context(
-                "hello",
-                [object()],
-                attachment_session_id="session-1",
+            prompt, warnings, attachment_names = asyncio.run(
+                _build_prompt_context(
+                    "hello",
+                    [object()],
+                    attachment_session_id="session-1",
+                )
             )
 
         self.assertIn("[KNOWLEDGE]", prompt)
@@ -135,10 +126,12 @@ class ApplyStreamChunkTests(unittest.TestCase):
             patch("app.ATTACHMENTS_ENABLED", False),
             patch("app.resolve_knowledge_dir", side_effect=ValueError("invalid knowledge dir")),
         ):
-            prompt, warnings, attachment_names = _build_prompt_context(
-                "hello",
-                [],
-                attachment_session_id="session-1",
+            prompt, warnings, attachment_names = asyncio.run(
+                _build_prompt_context(
+                    "hello",
+                    [],
+                    attachment_session_id="session-1",
+                )
             )
 
         self.assertIn("[USER_MESSAGE]", prompt)
@@ -152,10 +145,12 @@ class ApplyStreamChunkTests(unittest.TestCase):
             patch("app.ATTACHMENTS_ENABLED", True),
             patch("app.persist_attachments", side_effect=ValueError("invalid uploads dir")),
         ):
-            prompt, warnings, attachment_names = _build_prompt_context(
-                "hello",
-                [object()],
-                attachment_session_id="session-1",
+            prompt, warnings, attachment_names = asyncio.run(
+                _build_prompt_context(
+                    "hello",
+                    [object()],
+                    attachment_session_id="session-1",
+                )
             )
 
         self.assertIn("[USER_MESSAGE]", prompt)
@@ -163,47 +158,290 @@ class ApplyStreamChunkTests(unittest.TestCase):
         self.assertTrue(warnings)
         self.assertIn("invalid uploads dir", warnings[0])
 
+    def test_build_prompt_context_reports_both_errors_in_stage_order(self) -> None:
+        with (
+            patch("app.KNOWLEDGE_ENABLED", True),
+            patch("app.ATTACHMENTS_ENABLED", True),
+            patch("app.resolve_knowledge_dir", side_effect=ValueError("invalid knowledge dir")),
+            patch("app.persist_attachments", side_effect=ValueError("invalid uploads dir")),
+        ):
+            _, warnings, attachment_names = asyncio.run(
+                _build_prompt_context(
+                    "hello",
+                    [object()],
+                    attachment_session_id="session-1",
+                )
+            )
+
+        self.assertEqual(attachment_names, [])
+        self.assertEqual(len(warnings), 2)
+        self.assertIn("invalid knowledge dir", warnings[0])
+        self.assertIn("invalid uploads dir", warnings[1])
+
+    def test_build_prompt_context_propagates_unexpected_errors(self) -> None:
+        with (
+            patch("app.KNOWLEDGE_ENABLED", False),
+            patch("app.ATTACHMENTS_ENABLED", True),
+            patch("app.persist_attachments", side_effect=OSError("disk full")),
+        ):
+            with self.assertRaises(OSError):
+                asyncio.run(
+                    _build_prompt_context(
+                        "hello",
+                        [object()],
+                        attachment_session_id="session-1",
+                    )
+                )
+
+
+class JsonFormatterTests(unittest.TestCase):
+    """Structured log output."""
+
+    def test_formats_record_with_creation_timestamp(self) -> None:
+        record = logging.LogRecord("app", logging.INFO, __file__, 1, "こんにちは %s", ("x",), None)
+        record.created = 0.5
+
+        payload = json.loads(_JsonFormatter().format(record))
+
+        self.assertEqual(payload["timestamp"], "1970-01-01T00:00:00.500000+00:00")
+        self.assertEqual(payload["level"], "INFO")
+        self.assertEqual(payload["message"], "こんにちは x")
+        self.assertIn("こんにちは", _JsonFormatter().format(record))
+
+    def test_output_matches_generic_json_encoding(self) -> None:
+        formatter = _JsonFormatter()
+        try:
+            raise ValueError('bad "value"')
+        except ValueError:
+            record = logging.LogRecord(
+                'app"x', logging.ERROR, __file__, 1, 'quote " and\nnewline', None, sys.exc_info()
+            )
+
+        expected = json.dumps(
+            {
+                "timestamp": formatter.format(record).split('"')[3],
+                "level": "ERROR",
+                "logger": 'app"x',
+                "message": 'quote " and\nnewline',
+                "exception": formatter.formatException(cast(Any, record.exc_info)),
+            },
+            ensure_ascii=False,
+        )
+        self.assertEqual(formatter.format(record), expected)
+
+
+class ConfigureLoggingTests(unittest.TestCase):
+    """Root logger setup."""
+
+    def test_root_handler_is_installed_once_across_reruns(self) -> None:
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        self.addCleanup(setattr, root, "handlers", saved_handlers)
+        self.addCleanup(root.setLevel, saved_level)
+
+        _configure_logging()
+        installed = root.handlers[:]
+        _configure_logging()
+
+        self.assertEqual(len(installed), 1)
+        self.assertEqual(root.handlers, installed)
+
 
 class RateLimitTests(unittest.TestCase):
     """Behavior tests for minute-level request limiting."""
 
     def test_consume_rate_limit_allows_and_appends_timestamp(self) -> None:
-        updated, limited, retry = _consume_rate_limit(
+        timestamps = deque([10.0, 39.0])
+        limited, retry = _consume_rate_limit(
             100.0,
-            [10.0, 39.0],
+            timestamps,
             limit=3,
         )
 
         self.assertFalse(limited)
         self.assertEqual(retry, 0)
-        self.assertEqual(updated, [100.0])
+        self.assertEqual(list(timestamps), [100.0])
 
     def test_consume_rate_limit_blocks_at_limit(self) -> None:
-        updated, limited, retry = _consume_rate_limit(
+        timestamps = deque([50.0, 70.0, 80.0])
+        limited, retry = _consume_rate_limit(
             100.0,
-            [50.0, 70.0, 80.0],
+            timestamps,
             limit=3,
         )
 
         self.assertTrue(limited)
-        self.assertEqual(updated, [50.0, 70.0, 80.0])
+        self.assertEqual(list(timestamps), [50.0, 70.0, 80.0])
         self.assertEqual(retry, 10)
 
+    def test_consume_rate_limit_drops_only_expired_entries(self) -> None:
+        timestamps = deque([30.0, 40.0, 45.0])
+        limited, _ = _consume_rate_limit(100.0, timestamps, limit=3)
+
+        self.assertFalse(limited)
+        self.assertEqual(list(timestamps), [45.0, 100.0])
+
+
+class TrimHistoryTests(unittest.TestCase):
+    """Bounded chat transcript kept in session state."""
+
+    def test_history_within_limit_is_kept(self) -> None:
+        messages = [{"role": "user", "content": "hi"}]
+        self.assertEqual(_trim_history(messages, limit=2), 0)
+        self.assertEqual(len(messages), 1)
+
+    def test_oldest_messages_are_dropped_in_place(self) -> None:
+        messages = [{"role": "user", "content": str(i)} for i in range(5)]
+        original = messages
+
+        dropped = _trim_history(messages, limit=2)
+
+        self.assertEqual(dropped, 3)
+        self.assertIs(messages, original)
+        self.assertEqual([m["content"] for m in messages], ["3", "4"])
+
 
 class StartupUploadCleanupTests(unittest.TestCase):
     """Behavior tests for startup-time upload cleanup."""
 
-    def test_startup_cleanup_runs_once(self) -> None:
+    def test_startup_cleanup_is_requested_on_every_run(self) -> None:
+        # The once-per-process guard is in agent.attachments, which survives reruns.
         with patch("app.ATTACHMENTS_ENABLED", True):
-            with patch("app._UPLOADS_CLEANED_AT_STARTUP", False):
-                with patch("app.cleanup_all_uploads") as mock_cleanup:
-                    _cleanup_uploads_on_startup_once()
-                    _cleanup_uploads_on_startup_once()
-        self.assertEqual(mock_cleanup.call_count, 1)
+            with patch("app.schedule_startup_cleanup_once") as mock_schedule:
+                _cleanup_uploads_on_startup_once()
+                _cleanup_uploads_on_startup_once()
+        self.assertEqual(mock_schedule.call_count, 2)
 
     def test_startup_cleanup_is_skipped_when_attachments_disabled(self) -> None:
         with patch("app.ATTACHMENTS_ENABLED", False):
-            with patch("app._UPLOADS_CLEANED_AT_STARTUP", False):
-                with patch("app.cleanup_all_uploads") as mock_cleanup:
-                    _cleanup_uploads_on_startup_once()
-        mock_cleanup.assert_not_called()
+            with patch("app.schedule_startup_cleanup_once") as mock_schedule:
+                _cleanup_uploads_on_startup_once()
+        mock_schedule.assert_not_called()
+
+
+class _FakeStreamingAgent:
+    """Replays canned stream chunks."""
+
+    def __init__(self, chunks: list[dict[str, str]]) -> None:
+        self.chunks = chunks
+
+    async def send_message_streaming(self, prompt: str) -> AsyncIterator[dict[str, str]]:
+        for chunk in self.chunks:
+            yield chunk
+
+
+class StreamLayoutTests(unittest.TestCase):
+    """Finished markdown blocks are written once; only the tail is redrawn."""
+
+    def test_finished_blocks_are_written_once(self) -> None:
+        placeholder = MagicMock()
+        layout = _StreamLayout(placeholder, raw_text=False)
+        blocks = placeholder.container.return_value.container.return_value
+        tail = placeholder.container.return_value.empty.return_value
+
+        layout.render("First para")
+        layout.render("First paragraph.\n\nSecond")
+        layout.render("First paragraph.\n\nSecond one")
+
+        blocks.markdown.assert_called_once_with("First paragraph.\n\n")
+        self.assertEqual(tail.markdown.call_args.args[0], "Second one ▌")
+
+    def test_blank_lines_inside_code_fences_do_not_end_a_block(self) -> None:
+        placeholder = MagicMock()
+        layout = _StreamLayout(placeholder, raw_text=True)
+        blocks = placeholder.container.return_value.container.return_value
+        tail = placeholder.container.return_value.empty.return_value
+
+        layout.render("```\nline 1\n\nline 2\n")
+        blocks.text.assert_not_called()
+
+        layout.render("```\nline 1\n\nline 2\n```\n\nAfter")
+        blocks.text.assert_called_once_with("```\nline 1\n\nline 2\n```\n\n")
+        self.assertEqual(tail.text.call_args.args[0], "After ▌")
+        tail.markdown.assert_not_called()
+
+    def test_only_a_matching_fence_closes_a_code_block(self) -> None:
+        placeholder = MagicMock()
+        layout = _StreamLayout(placeholder, raw_text=False)
+        blocks = placeholder.container.return_value.container.return_value
+
+        # A tilde line inside a backtick fence, and a shorter backtick run inside a
+        # four-backtick fence, are code rather than closing fences.
+        text = "```\n~~~\n\ncode\n```\n\n````markdown\n```python\nx = 1\n\n```\n````\n\nAfter"
+        for end in range(1, len(text) + 1):
+            layout.render(text[:end])
+
+        written = [call.args[0] for call in blocks.markdown.call_args_list]
+        self.assertEqual(
+            written,
+            ["```\n~~~\n\ncode\n```\n\n", "````markdown\n```python\nx = 1\n\n```\n````\n\n"],
+        )
+
+
+class StreamResponseTests(unittest.TestCase):
+    """Rendering behavior of the streaming response loop."""
+
+    def _run(
+        self, chunks: list[dict[str, str]], *, tick: float = 0.0
+    ) -> tuple[str, MagicMock, MagicMock]:
+        """Stream chunks and return the text, the status mock and the redrawn tail mock."""
+        status = MagicMock()
+        response = MagicMock()
+        agent = cast(Any, _FakeStreamingAgent(chunks))
+        clock = itertools.count(start=100.0, step=tick) if tick else itertools.repeat(100.0)
+        with patch("app.time.monotonic", side_effect=lambda: next(clock)):
+            text = asyncio.run(_stream_response(agent, "hi", status, response))
+        return text, status, response.container.return_value.empty.return_value
+
+    def test_renders_are_capped_by_interval(self) -> None:
+        chunks = [{"type": "text_delta", "content": "words "} for _ in range(40)]
+        # Deltas arrive every 10 ms, so at most one render per five deltas.
+        text, status, tail = self._run(chunks, tick=0.01)
+
+        self.assertEqual(text, "words " * 40)
+        self.assertLessEqual(tail.markdown.call_count, 9)
+        self.assertGreaterEqual(tail.markdown.call_count, 7)
+        status.empty.assert_called()
+
+    def test_tiny_deltas_wait_for_enough_new_text(self) -> None:
+        chunks = [{"type": "text_delta", "content": "a "} for _ in range(3)]
+        _, _, tail = self._run(chunks, tick=1.0)
+
+        # Two-character deltas only render once eight characters are buffered.
+        tail.markdown.assert_not_called()
+
+    def test_pending_text_is_rendered_before_tool_status(self) -> None:
+        chunks = [
+            {"type": "text_delta", "content": "Let me check. "},
+            {"type": "text_delta", "content": "One moment. "},
+            {"type": "tool_use", "content": "Bash"},
+        ]
+        _, _, tail = self._run(chunks)
+
+        self.assertEqual(tail.markdown.call_args.args[0], "Let me check. One moment.  ▌")
+
+    def test_raw_text_mode_streams_without_markdown(self) -> None:
+        chunks = [{"type": "text_delta", "content": "**bold** reply"}]
+        with patch("app.STREAMING_RAW_TEXT", True):
+            text, _, tail = self._run(chunks)
+
+        self.assertEqual(text, "**bold** reply")
+        tail.markdown.assert_not_called()
+        # The unterminated last word is held back by the stream sanitizer.
+        self.assertEqual(tail.text.call_args.args[0], "**bold**  ▌")
+
+    def test_error_is_appended_and_done_without_content_is_ignored(self) -> None:
+        chunks = [
+            {"type": "text_delta", "content": "Partial"},
+            {"type": "error", "content": "stream broke"},
+            {"type": "done"},
+        ]
+        text, _, _ = self._run(chunks)
+
+        self.assertEqual(text, "Partial\n\nError: stream broke")
+
+    def test_error_content_is_sanitized(self) -> None:
+        chunks = [{"type": "error", "content": "bad key sk-ant-REDACTED"}]
+        text, _, _ = self._run(chunks)
+
+        self.assertEqual(text, "\n\nError: bad key [REDACTED_API_KEY]")
@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 import asyncio
+import gc
 import unittest
+from unittest.mock import patch
 
 from agent.async_bridge import AsyncBridge
 
@@ -91,3 +93,118 @@ class AsyncBridgeTests(unittest.TestCase):
             self.assertEqual(bridge.run(_add(10, 20)), 30)
         finally:
             bridge.shutdown()
+
+    def test_run_with_non_positive_timeout_raises_without_starting(self) -> None:
+        bridge = AsyncBridge()
+        started = False
+
+        async def _work() -> None:
+            nonlocal started
+            started = True
+
+        try:
+            with self.assertRaises(TimeoutError):
+                bridge.run(_work(), timeout=0)
+            self.assertFalse(started)
+        finally:
+            bridge.shutdown()
+
+    def test_event_loop_is_installed_once_per_thread(self) -> None:
+        bridge = AsyncBridge()
+
+        async def _noop() -> None:
+            return None
+
+        try:
+            with patch("agent.async_bridge.asyncio.set_event_loop") as mock_set_loop:
+                bridge.run(_noop())
+                bridge.run(_noop())
+            self.assertEqual(mock_set_loop.call_count, 1)
+        finally:
+            bridge.shutdown()
+
+    def test_restart_recovers_closed_bridge(self) -> None:
+        bridge = AsyncBridge()
+        bridge.shutdown()
+        self.assertFalse(bridge.is_alive)
+
+        async def _hello() -> str:
+            return "again"
+
+        try:
+            bridge.restart()
+            self.assertTrue(bridge.is_alive)
+            self.assertEqual(bridge.run(_hello()), "again")
+        finally:
+            bridge.shutdown()
+
+    def test_shutdown_cancels_pending_tasks(self) -> None:
+        bridge = AsyncBridge()
+
+        async def _spawn() -> asyncio.Task[None]:
+            return asyncio.get_running_loop().create_task(asyncio.sleep(10))
+
+        task = bridge.run(_spawn())
+        bridge.shutdown()
+
+        self.assertTrue(task.cancelled())
+        self.assertFalse(bridge.is_alive)
+
+    def test_shared_loop_is_reused_after_shutdown(self) -> None:
+        first = AsyncBridge()
+        loop = first._loop
+        first.shutdown()
+
+        second = AsyncBridge()
+        try:
+            self.assertIs(second._loop, loop)
+            self.assertFalse(loop.is_closed())
+        finally:
+            second.shutdown()
+
+    def test_concurrent_bridges_get_distinct_loops(self) -> None:
+        first = AsyncBridge()
+        second = AsyncBridge()
+        private_loop = second._loop
+
+        async def _hello() -> str:
+            return "ok"
+
+        try:
+            self.assertIsNot(first._loop, second._loop)
+            self.assertEqual(second.run(_hello()), "ok")
+        finally:
+            second.shutdown()
+            first.shutdown()
+
+        self.assertTrue(private_loop.is_closed())
+
+    def test_restart_replaces_the_shared_loop(self) -> None:
+        bridge = AsyncBridge()
+        old_loop = bridge._loop
+
+        try:
+            bridge.restart()
+            self.assertIsNot(bridge._loop, old_loop)
+            self.assertTrue(old_loop.is_closed())
+        finally:
+            bridge.shutdown()
+
+        # The new loop is the shared one from now on.
+        other = AsyncBridge()
+        try:
+            self.assertIs(other._loop, bridge._loop)
+        finally:
+            other.shutdown()
+
+    def test_dropped_bridge_returns_the_shared_loop(self) -> None:
+        bridge = AsyncBridge()
+        loop = bridge._loop
+        del bridge
+        gc.collect()
+
+        other = AsyncBridge()
+        try:
+            self.assertIs(other._loop, loop)
+        finally:
+            other.shutdown()
@@ -2,14 +2,22 @@
 
 from __future__ import annotations
 
+import os
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
+from typing import Any
+from unittest.mock import patch
 
 from agent.attachments import (
     cleanup_all_uploads,
     persist_attachments,
     resolve_storage_root,
+    schedule_cleanup_all_uploads,
+    schedule_startup_cleanup_once,
+    wait_for_scheduled_cleanup,
 )
 
 
@@ -17,15 +25,20 @@ class _FakeUpload:
     def __init__(self, name: str, payload: bytes) -> None:
         self.name = name
         self._payload = payload
+        self._offset = 0
         self.seek_calls = 0
 
-    def read(self) -> bytes:
-        return self._payload
+    def read(self, size: int = -1, /) -> bytes:
+        end = len(self._payload) if size < 0 else self._offset + size
+        chunk = self._payload[self._offset : end]
+        self._offset += len(chunk)
+        return chunk
 
     def seek(self, offset: int, whence: int = 0) -> int:
-        del offset, whence
+        del whence
         self.seek_calls += 1
-        return 0
+        self._offset = offset
+        return offset
 
 
 class AttachmentTests(unittest.TestCase):
@@ -84,6 +97,64 @@ class AttachmentTests(unittest.TestCase):
             self.assertEqual(result.attachments, [])
             self.assertEqual(len(result.warnings), 1)
             self.assertIn("file size exceeds", result.warnings[0])
+            self.assertEqual(list((root / "uploads" / "session-1").iterdir()), [])
+
+    def test_persists_attachment_larger_than_copy_chunk(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            payload = b"abcdefgh" * 5
+            with patch("agent.attachments._COPY_CHUNK_BYTES", 7):
+                result = persist_attachments(
+                    [_FakeUpload("big.txt", payload)],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="session-1",
+                    allowed_extensions=("txt",),
+                    max_file_bytes=1024,
+                )
+
+            self.assertEqual(result.attachments[0].size_bytes, len(payload))
+            saved_path = root / result.attachments[0].relative_path
+            self.assertEqual(saved_path.read_bytes(), payload)
+
+    def test_persists_file_descriptor_backed_upload(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            source = root / "source.txt"
+            source.write_bytes(b"from disk")
+            with source.open("rb") as upload:
+                result = persist_attachments(
+                    [upload],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="session-1",
+                    allowed_extensions=("txt",),
+                    max_file_bytes=1024,
+                )
+
+            self.assertEqual(result.attachments[0].filename, "source.txt")
+            self.assertEqual(result.attachments[0].size_bytes, 9)
+            saved_path = root / result.attachments[0].relative_path
+            self.assertEqual(saved_path.read_bytes(), b"from disk")
+
+    def test_skips_file_descriptor_backed_upload_over_limit(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            source = root / "source.txt"
+            source.write_bytes(b"x" * 10)
+            with source.open("rb") as upload:
+                result = persist_attachments(
+                    [upload],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="session-1",
+                    allowed_extensions=("txt",),
+                    max_file_bytes=5,
+                )
+
+            self.assertEqual(result.attachments, [])
+            self.assertIn("file size exceeds", result.warnings[0])
+            self.assertEqual(list((root / "uploads" / "session-1").iterdir()), [])
 
     def test_duplicate_filename_gets_unique_suffix(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -106,6 +177,58 @@ class AttachmentTests(unittest.TestCase):
             self.assertEqual((root / rel_paths[0]).read_bytes(), b"one")
             self.assertEqual((root / rel_paths[1]).read_bytes(), b"two")
 
+    def test_duplicate_filename_continues_after_highest_suffix(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            session_dir = root / "uploads" / "session-1"
+            session_dir.mkdir(parents=True)
+            for name in ("note.txt", "note_1.txt", "note_5.txt", "note_x.txt"):
+                (session_dir / name).write_bytes(b"old")
+
+            result = persist_attachments(
+                [_FakeUpload("note.txt", b"new")],
+                project_root=root,
+                storage_dir="uploads",
+                session_id="session-1",
+                allowed_extensions=("txt",),
+                max_file_bytes=1024,
+            )
+
+            self.assertEqual(result.attachments[0].relative_path, "uploads/session-1/note_6.txt")
+            self.assertEqual((session_dir / "note_6.txt").read_bytes(), b"new")
+
+    def test_case_variant_name_never_overwrites_existing_upload(self) -> None:
+        real_open = os.open
+
+        def case_insensitive_open(path: Any, flags: int, mode: int = 0o777) -> int:
+            # Emulate a case-insensitive filesystem such as the macOS default.
+            target = Path(path)
+            if flags & os.O_EXCL and any(
+                entry.name.lower() == target.name.lower() for entry in target.parent.iterdir()
+            ):
+                raise FileExistsError(path)
+            return real_open(path, flags, mode)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            session_dir = root / "uploads" / "session-1"
+            session_dir.mkdir(parents=True)
+            (session_dir / "Report.txt").write_bytes(b"first")
+
+            with patch("agent.attachments.os.open", side_effect=case_insensitive_open):
+                result = persist_attachments(
+                    [_FakeUpload("report.txt", b"second")],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="session-1",
+                    allowed_extensions=("txt",),
+                    max_file_bytes=1024,
+                )
+
+            self.assertEqual(result.attachments[0].relative_path, "uploads/session-1/report_1.txt")
+            self.assertEqual((session_dir / "Report.txt").read_bytes(), b"first")
+            self.assertEqual((session_dir / "report_1.txt").read_bytes(), b"second")
+
     def test_cleanup_all_uploads_removes_runtime_files_but_keeps_gitkeep(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -137,6 +260,68 @@ class AttachmentTests(unittest.TestCase):
             remaining = [path.name for path in uploads.iterdir()]
             self.assertEqual(remaining, [".gitkeep"])
 
+    def test_scheduled_cleanup_failure_is_logged(self) -> None:
+        with (
+            patch("agent.attachments.cleanup_all_uploads", side_effect=OSError("busy")),
+            self.assertLogs("agent.attachments", level="ERROR") as logs,
+        ):
+            schedule_cleanup_all_uploads(
+                project_root=Path("."), storage_dir="uploads", failure_message="cleanup failed"
+            )
+            wait_for_scheduled_cleanup()
+
+        self.assertIn("cleanup failed", logs.output[0])
+
+    def test_startup_cleanup_is_scheduled_once_per_process(self) -> None:
+        with (
+            patch("agent.attachments._STARTUP_CLEANUP_SCHEDULED", False),
+            patch("agent.attachments.schedule_cleanup_all_uploads") as mock_schedule,
+        ):
+            first = schedule_startup_cleanup_once(project_root=Path("."), storage_dir="uploads")
+            second = schedule_startup_cleanup_once(project_root=Path("."), storage_dir="uploads")
+
+        mock_schedule.assert_called_once()
+        self.assertIs(first, mock_schedule.return_value)
+        self.assertIsNone(second)
+
+    def test_persist_waits_for_scheduled_cleanup(self) -> None:
+        cleanup_started = threading.Event()
+        cleanup_done = threading.Event()
+
+        def slow_cleanup(**_: Any) -> None:
+            cleanup_started.set()
+            time.sleep(0.05)
+            cleanup_done.set()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            with patch("agent.attachments.cleanup_all_uploads", side_effect=slow_cleanup):
+                schedule_cleanup_all_uploads(project_root=root, storage_dir="uploads")
+                cleanup_started.wait()
+                persist_attachments(
+                    [_FakeUpload("memo.md", b"hello")],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="session-1",
+                    allowed_extensions=("md",),
+                    max_file_bytes=1024,
+                )
+                # Checked right after persisting: it must not have started before cleanup.
+                self.assertTrue(cleanup_done.is_set())
+
+    def test_rejects_session_id_that_escapes_storage_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            with self.assertRaises(ValueError):
+                persist_attachments(
+                    [_FakeUpload("memo.md", b"hello")],
+                    project_root=root,
+                    storage_dir="uploads",
+                    session_id="..",
+                    allowed_extensions=("md",),
+                    max_file_bytes=1024,
+                )
+
     def test_resolve_storage_root_rejects_directory_outside_project(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -4,8 +4,10 @@ from __future__ import annotations
 
 import asyncio
 import unittest
+from collections.abc import AsyncGenerator
 from pathlib import Path
 from types import SimpleNamespace
+from typing import cast
 from unittest.mock import patch
 
 import agent.client as client_module
@@ -22,7 +24,7 @@ class FakeTextBlock:
 
 
 class FakeAssistantMessage:
-    def __init__(self, content: list[FakeTextBlock]) -> None:
+    def __init__(self, content: list[object]) -> None:
         self.content = content
 
 
@@ -62,10 +64,13 @@ class FakeSDKClient:
     response_scenarios: list[list[object]] = []
     connect_failures = 0
     query_failures = 0
+    query_exception: type[Exception] = RuntimeError
     query_history: list[str] = []
+    instances = 0
 
     def __init__(self, options) -> None:
         del options  # Not needed in tests.
+        type(self).instances += 1
         if type(self).response_scenarios:
             self._responses = list(type(self).response_scenarios.pop(0))
         else:
@@ -76,7 +81,9 @@ class FakeSDKClient:
         cls.response_scenarios = []
         cls.connect_failures = 0
         cls.query_failures = 0
+        cls.query_exception = RuntimeError
         cls.query_history = []
+        cls.instances = 0
 
     async def connect(self) -> None:
         if type(self).connect_failures > 0:
@@ -90,10 +97,12 @@ class FakeSDKClient:
         type(self).query_history.append(user_message)
         if type(self).query_failures > 0:
             type(self).query_failures -= 1
-            raise RuntimeError("query failure")
+            raise type(self).query_exception("query failure")
 
     async def receive_response(self):
         for response in self._responses:
+            if isinstance(response, Exception):
+                raise response
             yield response
 
 
@@ -165,6 +174,42 @@ class ClaudeChatAgentTests(unittest.TestCase):
             ],
         )
 
+    def test_reports_tool_use_blocks_after_text_deltas(self) -> None:
+        FakeSDKClient.response_scenarios = [
+            [
+                FakeStreamEvent(
+                    {
+                        "type": "content_block_delta",
+                        "delta": {"type": "text_delta", "text": "Hi"},
+                    }
+                ),
+                FakeAssistantMessage(
+                    [
+                        FakeTextBlock("Hi"),
+                        client_module.ToolUseBlock(id="tool-1", name="Bash", input={}),
+                    ]
+                ),
+                FakeResultMessage(session_id="sid-3"),
+            ]
+        ]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=0,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(
+            chunks,
+            [
+                {"type": "text_delta", "content": "Hi"},
+                {"type": "tool_use", "content": "Bash"},
+                {"type": "done", "content": "sid-3"},
+            ],
+        )
+
     def test_uses_assistant_text_when_no_deltas_present(self) -> None:
         FakeSDKClient.response_scenarios = [
             [FakeAssistantMessage([FakeTextBlock("Hello")]), FakeResultMessage(session_id="sid-2")]
@@ -186,10 +231,9 @@ class ClaudeChatAgentTests(unittest.TestCase):
             ],
         )
 
-    def test_retries_after_transient_query_failure(self) -> None:
+    def test_retries_on_same_client_after_transient_query_failure(self) -> None:
         FakeSDKClient.query_failures = 1
         FakeSDKClient.response_scenarios = [
-            [],
             [FakeAssistantMessage([FakeTextBlock("Recovered")]), FakeResultMessage()],
         ]
 
@@ -202,6 +246,7 @@ class ClaudeChatAgentTests(unittest.TestCase):
             chunks = self._collect_chunks(agent)
 
         self.assertEqual(FakeSDKClient.query_history, ["hello", "hello"])
+        self.assertEqual(FakeSDKClient.instances, 1)
         self.assertEqual(
             chunks,
             [
@@ -210,6 +255,96 @@ class ClaudeChatAgentTests(unittest.TestCase):
             ],
         )
 
+    def test_reconnects_after_connection_error(self) -> None:
+        FakeSDKClient.query_failures = 1
+        FakeSDKClient.query_exception = ConnectionError
+        FakeSDKClient.response_scenarios = [
+            [],
+            [FakeAssistantMessage([FakeTextBlock("Recovered")]), FakeResultMessage()],
+        ]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=1,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(FakeSDKClient.instances, 2)
+        self.assertEqual(chunks[0], {"type": "text", "content": "Recovered"})
+
+    def test_reconnects_after_second_generic_failure(self) -> None:
+        FakeSDKClient.query_failures = 2
+        FakeSDKClient.response_scenarios = [
+            [],
+            [FakeAssistantMessage([FakeTextBlock("Recovered")]), FakeResultMessage()],
+        ]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=2,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(FakeSDKClient.query_history, ["hello", "hello", "hello"])
+        self.assertEqual(FakeSDKClient.instances, 2)
+        self.assertEqual(chunks[0], {"type": "text", "content": "Recovered"})
+
+    def test_reconnects_after_failure_mid_response(self) -> None:
+        FakeSDKClient.response_scenarios = [
+            [RuntimeError("stream broke")],
+            [FakeAssistantMessage([FakeTextBlock("Recovered")]), FakeResultMessage()],
+        ]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=1,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(FakeSDKClient.instances, 2)
+        self.assertEqual(chunks[0], {"type": "text", "content": "Recovered"})
+        self.assertFalse(agent._in_flight)
+
+    def test_reconnects_after_abandoned_response(self) -> None:
+        FakeSDKClient.response_scenarios = [
+            [
+                FakeAssistantMessage([FakeTextBlock("First")]),
+                FakeAssistantMessage([FakeTextBlock("Stale")]),
+                FakeResultMessage(),
+            ],
+            [FakeAssistantMessage([FakeTextBlock("Second")]), FakeResultMessage()],
+        ]
+
+        async def _read_first_chunk(agent: client_module.ClaudeChatAgent) -> None:
+            stream = cast(
+                AsyncGenerator[client_module.StreamChunk, None],
+                agent.send_message_streaming("first"),
+            )
+            await anext(stream)
+            # Stands in for a timeout or cancellation while the reply is still streaming.
+            await stream.aclose()
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=0,
+                retry_backoff_seconds=0,
+            )
+            asyncio.run(_read_first_chunk(agent))
+            self.assertTrue(agent._in_flight)
+            chunks = self._collect_chunks(agent, "second")
+
+        self.assertEqual(FakeSDKClient.instances, 2)
+        self.assertEqual(chunks[0], {"type": "text", "content": "Second"})
+        self.assertNotIn({"type": "text", "content": "Stale"}, chunks)
+        self.assertFalse(agent._in_flight)
+
     def test_returns_error_chunk_after_retry_exhaustion(self) -> None:
         FakeSDKClient.query_failures = 5
         FakeSDKClient.response_scenarios = [[], []]
@@ -344,6 +479,23 @@ class ClaudeChatAgentTests(unittest.TestCase):
             self.assertFalse(agent._connected)
             self.assertIsNone(agent._client)
 
+    def test_discard_client_resets_state_without_disconnect(self) -> None:
+        FakeSDKClient.response_scenarios = [[]]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=0,
+                retry_backoff_seconds=0,
+            )
+            asyncio.run(agent.connect())
+            with patch.object(FakeSDKClient, "disconnect") as mock_disconnect:
+                agent.discard_client()
+
+        mock_disconnect.assert_not_called()
+        self.assertIsNone(agent._client)
+        self.assertFalse(agent._connected)
+
     def test_connect_is_idempotent(self) -> None:
         FakeSDKClient.response_scenarios = [[]]
 
@@ -393,6 +545,62 @@ class ClaudeChatAgentTests(unittest.TestCase):
 
         self.assertEqual(options.sandbox, {"enabled": True})
 
+    def test_build_options_is_cached_until_model_changes(self) -> None:
+        with patch.object(
+            client_module,
+            "ClaudeAgentOptions",
+            side_effect=lambda **kwargs: SimpleNamespace(**kwargs),
+        ):
+            agent = client_module.ClaudeChatAgent(project_root=Path("."), model="model-a")
+            first = agent._build_options()
+            self.assertIs(agent._build_options(), first)
+
+            agent.model = "model-b"
+            second = agent._build_options()
+            agent.permission_mode = "plan"
+            third = agent._build_options()
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second.model, "model-b")
+        self.assertEqual(third.permission_mode, "plan")
+
+    def test_build_options_checks_mcp_config_once(self) -> None:
+        client_module.reset_mcp_cache()
+        self.addCleanup(client_module.reset_mcp_cache)
+        with (
+            patch.object(
+                client_module,
+                "ClaudeAgentOptions",
+                side_effect=lambda **kwargs: SimpleNamespace(**kwargs),
+            ),
+            patch.object(client_module, "MCP_CONFIG_PATH") as mock_path,
+        ):
+            mock_path.exists.return_value = True
+            agent = client_module.ClaudeChatAgent(project_root=Path("."))
+            first = agent._build_options()
+            second = agent._build_options()
+
+        self.assertIs(first.mcp_servers, mock_path)
+        self.assertIs(second.mcp_servers, mock_path)
+        mock_path.exists.assert_called_once_with()
+
+    def test_build_options_uses_empty_mcp_config_when_file_missing(self) -> None:
+        client_module.reset_mcp_cache()
+        self.addCleanup(client_module.reset_mcp_cache)
+        with (
+            patch.object(
+                client_module,
+                "ClaudeAgentOptions",
+                side_effect=lambda **kwargs: SimpleNamespace(**kwargs),
+            ),
+            patch.object(client_module, "MCP_CONFIG_PATH") as mock_path,
+        ):
+            mock_path.exists.return_value = False
+            agent = client_module.ClaudeChatAgent(project_root=Path("."))
+            options = agent._build_options()
+
+        self.assertEqual(options.mcp_servers, {})
+
     def test_unknown_message_class_is_silently_skipped(self) -> None:
         """Messages of an unrecognized type are logged but not yielded."""
 
@@ -416,6 +624,52 @@ class ClaudeChatAgentTests(unittest.TestCase):
             [{"type": "done", "content": "sid-u"}],
         )
 
+    def test_stream_event_tool_use_start_and_missing_delta(self) -> None:
+        FakeSDKClient.response_scenarios = [
+            [
+                FakeStreamEvent({"type": "content_block_delta"}),
+                FakeStreamEvent(
+                    {
+                        "type": "content_block_start",
+                        "content_block": {"type": "tool_use", "name": "Read"},
+                    }
+                ),
+                FakeResultMessage(session_id="sid-t"),
+            ]
+        ]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=0,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(
+            chunks,
+            [
+                {"type": "tool_use", "content": "Read"},
+                {"type": "done", "content": "sid-t"},
+            ],
+        )
+
+    def test_message_subclass_uses_parent_handler(self) -> None:
+        class CustomResultMessage(FakeResultMessage):
+            pass
+
+        FakeSDKClient.response_scenarios = [[CustomResultMessage(session_id="sid-s")]]
+
+        with self._patch_dependencies():
+            agent = client_module.ClaudeChatAgent(
+                project_root=Path("."),
+                max_retries=0,
+                retry_backoff_seconds=0,
+            )
+            chunks = self._collect_chunks(agent)
+
+        self.assertEqual(chunks, [{"type": "done", "content": "sid-s"}])
+
     def test_ignored_stream_event_types_produce_no_chunks(self) -> None:
         """StreamEvent types like 'ping' and 'message_start' are silently ignored."""
         FakeSDKClient.response_scenarios = [
@@ -44,3 +44,27 @@ class PromptContextBuilderTests(unittest.TestCase):
 
         self.assertLessEqual(len(prompt), 60)
         self.assertIn("[USER_MESSAGE]", prompt)
+
+    def test_build_marks_truncated_section_and_keeps_separator(self) -> None:
+        builder = PromptContextBuilder("q", max_chars=60)
+        builder.add_knowledge_preamble("k" * 100)
+        prompt = builder.build()
+
+        user_section = "[USER_MESSAGE]\nq"
+        context_budget = 60 - len(user_section) - 2
+        suffix = "...[context truncated]"
+        expected_context = "k" * (context_budget - len(suffix)) + suffix
+        self.assertEqual(prompt, f"{expected_context}\n\n{user_section}")
+
+    def test_build_keeps_all_sections_when_budget_is_exact(self) -> None:
+        builder = PromptContextBuilder("q", max_chars=1000)
+        builder.add_knowledge_preamble("knowledge")
+        builder.add_knowledge_preamble("more")
+        expected = "knowledge\n\nmore\n\n[USER_MESSAGE]\nq"
+
+        exact = PromptContextBuilder("q", max_chars=len(expected))
+        exact.add_knowledge_preamble("knowledge")
+        exact.add_knowledge_preamble("more")
+
+        self.assertEqual(builder.build(), expected)
+        self.assertEqual(exact.build(), expected)
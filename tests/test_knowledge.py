@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 
-import subprocess
+import io
+import json
+import os
+import shutil
 import tempfile
 import unittest
+from collections import OrderedDict
 from pathlib import Path
 from unittest.mock import patch
 
@@ -18,6 +22,35 @@ from agent.knowledge import (
 )
 
 
+def _rg_match(path: str, line: int, text: str) -> dict[str, object]:
+    return {
+        "type": "match",
+        "data": {"path": {"text": path}, "lines": {"text": text}, "line_number": line},
+    }
+
+
+class _FakePopen:
+    """Minimal Popen stand-in that serves canned rg stdout."""
+
+    def __init__(self, stdout: str) -> None:
+        self.args: list[str] = []
+        self.stdout = io.StringIO(stdout)
+        self.returncode: int | None = None
+        self.killed = False
+
+    def poll(self) -> int | None:
+        return self.returncode
+
+    def kill(self) -> None:
+        self.killed = True
+        self.returncode = -9
+
+    def wait(self) -> int | None:
+        if self.returncode is None:
+            self.returncode = 0
+        return self.returncode
+
+
 class KnowledgeTests(unittest.TestCase):
     """Validate directory safety, file listing, and search behavior."""
 
@@ -27,6 +60,15 @@ class KnowledgeTests(unittest.TestCase):
             with self.assertRaises(ValueError):
                 resolve_knowledge_dir(root, "../outside")
 
+    def test_resolve_knowledge_dir_caches_only_valid_results(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            first = resolve_knowledge_dir(root, "knowledge")
+            self.assertIs(resolve_knowledge_dir(root, "knowledge"), first)
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    resolve_knowledge_dir(root, "../elsewhere")
+
     def test_list_markdown_files_returns_project_relative_paths(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -41,11 +83,57 @@ class KnowledgeTests(unittest.TestCase):
 
         self.assertEqual(files, ["knowledge/a.md", "knowledge/nested/c.md"])
 
+    def test_list_markdown_files_skips_hidden_entries_and_symlinks(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            (knowledge / ".drafts").mkdir(parents=True)
+            (knowledge / "a.md").write_text("token", encoding="utf-8")
+            (knowledge / ".hidden.md").write_text("token", encoding="utf-8")
+            (knowledge / ".drafts" / "b.md").write_text("token", encoding="utf-8")
+            outside = root / "outside"
+            outside.mkdir()
+            (outside / "secret.md").write_text("token", encoding="utf-8")
+            (knowledge / "linked.md").symlink_to(outside / "secret.md")
+            (knowledge / "linked_dir").symlink_to(outside, target_is_directory=True)
+
+            files = list_knowledge_markdown_files(knowledge, root)
+            with patch("agent.knowledge._SEARCH_CACHE", OrderedDict()):
+                hits = search_knowledge_markdown(
+                    "token", knowledge_dir=knowledge, project_root=root, max_hits=10
+                )
+
+        self.assertEqual(files, ["knowledge/a.md"])
+        self.assertEqual([hit.path for hit in hits], ["knowledge/a.md"])
+
+    def test_list_markdown_files_reuses_listing_until_a_directory_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            (knowledge / "nested").mkdir(parents=True)
+            (knowledge / "a.md").write_text("A", encoding="utf-8")
+
+            first = list_knowledge_markdown_files(knowledge, root)
+            with patch("agent.knowledge.os.scandir") as mock_scandir:
+                second = list_knowledge_markdown_files(knowledge, root)
+            mock_scandir.assert_not_called()
+
+            (knowledge / "nested" / "b.md").write_text("B", encoding="utf-8")
+            third = list_knowledge_markdown_files(knowledge, root)
+
+        self.assertEqual(first, ["knowledge/a.md"])
+        self.assertEqual(second, first)
+        self.assertEqual(third, ["knowledge/a.md", "knowledge/nested/b.md"])
+
     def test_build_pattern_escapes_special_characters(self) -> None:
         pattern = build_knowledge_pattern("auth? token+")
         self.assertIn(r"\bauth\b", pattern)
         self.assertIn(r"token\+", pattern)
 
+    def test_build_pattern_trims_only_edge_punctuation(self) -> None:
+        pattern = build_knowledge_pattern("(auth.token)?")
+        self.assertEqual(pattern, r"auth\.token")
+
     def test_build_pattern_skips_english_stopwords(self) -> None:
         pattern = build_knowledge_pattern("What is the recommended auth mode?")
         self.assertIn(r"\brecommended\b", pattern)
@@ -95,15 +183,19 @@ class KnowledgeTests(unittest.TestCase):
             knowledge.mkdir()
             target = knowledge / "guide.md"
             target.write_text("line1\nline2\nline3", encoding="utf-8")
-            fake_stdout = f"{target}:3:line3\n"
-
-            with patch(
-                "agent.knowledge.subprocess.run",
-                return_value=subprocess.CompletedProcess(
-                    args=[],
-                    returncode=0,
-                    stdout=fake_stdout,
-                    stderr="",
+            records = [
+                {"type": "begin", "data": {"path": {"text": str(target)}}},
+                _rg_match(str(target), 3, "line3\n"),
+                _rg_match(f"{knowledge}/../secret.md", 1, "leak\n"),
+                {"type": "end", "data": {"path": {"text": str(target)}}},
+            ]
+            fake_stdout = "\n".join(json.dumps(record) for record in records) + "\n"
+
+            with (
+                patch("agent.knowledge._IN_PROCESS_SEARCH_MAX_BYTES", 0),
+                patch(
+                    "agent.knowledge.subprocess.Popen",
+                    return_value=_FakePopen(fake_stdout),
                 ),
             ):
                 hits = search_knowledge_markdown(
@@ -118,6 +210,32 @@ class KnowledgeTests(unittest.TestCase):
         self.assertEqual(hits[0].line, 3)
         self.assertEqual(hits[0].snippet, "line3")
 
+    def test_rg_search_stops_process_at_max_hits(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            target = knowledge / "guide.md"
+            target.write_text("x", encoding="utf-8")
+            records = [_rg_match(str(target), line, f"hit {line}\n") for line in range(1, 6)]
+            process = _FakePopen("\n".join(json.dumps(record) for record in records))
+
+            with (
+                patch("agent.knowledge._IN_PROCESS_SEARCH_MAX_BYTES", 0),
+                patch("agent.knowledge.subprocess.Popen", return_value=process) as mock_popen,
+            ):
+                hits = search_knowledge_markdown(
+                    "hit",
+                    knowledge_dir=knowledge,
+                    project_root=root,
+                    max_hits=2,
+                )
+
+        self.assertEqual([hit.line for hit in hits], [1, 2])
+        self.assertTrue(process.killed)
+        command = mock_popen.call_args.args[0]
+        self.assertEqual(command[command.index("-m") + 1], "2")
+
     def test_search_falls_back_when_rg_not_installed(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -125,7 +243,10 @@ class KnowledgeTests(unittest.TestCase):
             knowledge.mkdir()
             (knowledge / "faq.md").write_text("How to authenticate\nUse API key", encoding="utf-8")
 
-            with patch("agent.knowledge.subprocess.run", side_effect=FileNotFoundError):
+            with (
+                patch("agent.knowledge._IN_PROCESS_SEARCH_MAX_BYTES", 0),
+                patch("agent.knowledge.subprocess.Popen", side_effect=FileNotFoundError),
+            ):
                 hits = search_knowledge_markdown(
                     "authenticate",
                     knowledge_dir=knowledge,
@@ -135,3 +256,188 @@ class KnowledgeTests(unittest.TestCase):
 
         self.assertEqual(len(hits), 1)
         self.assertEqual(hits[0].path, "knowledge/faq.md")
+
+    def test_search_small_corpus_runs_in_process(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            (knowledge / "faq.md").write_text("intro\nRotate the API key", encoding="utf-8")
+
+            with patch("agent.knowledge.subprocess.Popen") as mock_popen:
+                hits = search_knowledge_markdown(
+                    "rotate",
+                    knowledge_dir=knowledge,
+                    project_root=root,
+                    max_hits=5,
+                )
+
+        mock_popen.assert_not_called()
+        self.assertEqual(
+            hits,
+            [KnowledgeMatch(path="knowledge/faq.md", line=2, snippet="Rotate the API key")],
+        )
+
+    def test_case_folded_characters_match_like_the_regex(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            lines = [f"filler line {index}" for index in range(2000)]
+            lines[5] = "the cla\u017fs keyword"  # LATIN SMALL LETTER LONG S folds to "s"
+            lines[6] = "a plain class"
+            (knowledge / "big.md").write_text("\n".join(lines), encoding="utf-8")
+
+            def run_search(query: str, mmap_min_bytes: int) -> list[int]:
+                with (
+                    patch("agent.knowledge._MMAP_MIN_BYTES", mmap_min_bytes),
+                    patch("agent.knowledge._SEARCH_CACHE", OrderedDict()),
+                ):
+                    hits = search_knowledge_markdown(
+                        query, knowledge_dir=knowledge, project_root=root, max_hits=10
+                    )
+                return [hit.line for hit in hits]
+
+            for mmap_min_bytes in (0, 1 << 30):
+                with self.subTest(mmap_min_bytes=mmap_min_bytes):
+                    self.assertEqual(run_search("class", mmap_min_bytes), [6, 7])
+                    self.assertEqual(run_search("cla\u017fs", mmap_min_bytes), [6, 7])
+
+    def test_search_uses_smart_case_like_rg(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            lines = ["API key rotation", "api lowercase", "Api mixed"]
+            (knowledge / "faq.md").write_text("\n".join(lines), encoding="utf-8")
+
+            def run_search(query: str, *, mmap_min_bytes: int, max_bytes: int) -> list[int]:
+                with (
+                    patch("agent.knowledge._MMAP_MIN_BYTES", mmap_min_bytes),
+                    patch("agent.knowledge._IN_PROCESS_SEARCH_MAX_BYTES", max_bytes),
+                    patch("agent.knowledge._SEARCH_CACHE", OrderedDict()),
+                ):
+                    hits = search_knowledge_markdown(
+                        query, knowledge_dir=knowledge, project_root=root, max_hits=10
+                    )
+                return [hit.line for hit in hits]
+
+            paths = [(1 << 30, 1 << 30), (0, 1 << 30)]
+            if shutil.which("rg") is not None:
+                paths.append((1 << 30, -1))
+            for mmap_min_bytes, max_bytes in paths:
+                with self.subTest(mmap_min_bytes=mmap_min_bytes, max_bytes=max_bytes):
+                    self.assertEqual(
+                        run_search("API", mmap_min_bytes=mmap_min_bytes, max_bytes=max_bytes),
+                        [1],
+                    )
+                    self.assertEqual(
+                        run_search("api", mmap_min_bytes=mmap_min_bytes, max_bytes=max_bytes),
+                        [1, 2, 3],
+                    )
+
+    def test_mmap_scan_matches_line_scan(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            lines = [f"filler line {index}" for index in range(2000)]
+            lines[3] = "Token rotation: see token docs"
+            lines[1500] = "  rotate the TOKEN\r"
+            lines.append("final token")
+            (knowledge / "big.md").write_text("\n".join(lines), encoding="utf-8")
+
+            def run_search(mmap_min_bytes: int) -> list[KnowledgeMatch]:
+                with (
+                    patch("agent.knowledge._MMAP_MIN_BYTES", mmap_min_bytes),
+                    patch("agent.knowledge._SEARCH_CACHE", OrderedDict()),
+                ):
+                    return search_knowledge_markdown(
+                        "token",
+                        knowledge_dir=knowledge,
+                        project_root=root,
+                        max_hits=10,
+                    )
+
+            via_mmap = run_search(0)
+            via_lines = run_search(1 << 30)
+
+        self.assertEqual(via_mmap, via_lines)
+        self.assertEqual([hit.line for hit in via_mmap], [4, 1501, 2001])
+
+    def test_mmap_scan_uses_unicode_word_boundaries(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            lines = [f"filler line {index}" for index in range(2000)]
+            lines[10] = "APIキーの設定方法"
+            lines[20] = "API の設定方法"
+            lines[30] = "\u212aey rotation"  # KELVIN SIGN folds to "k"
+            (knowledge / "big.md").write_text("\n".join(lines), encoding="utf-8")
+
+            def run_search(query: str, mmap_min_bytes: int) -> list[KnowledgeMatch]:
+                with (
+                    patch("agent.knowledge._MMAP_MIN_BYTES", mmap_min_bytes),
+                    patch("agent.knowledge._SEARCH_CACHE", OrderedDict()),
+                ):
+                    return search_knowledge_markdown(
+                        query,
+                        knowledge_dir=knowledge,
+                        project_root=root,
+                        max_hits=10,
+                    )
+
+            for query, expected_lines in (("API", [21]), ("key", [31])):
+                via_mmap = run_search(query, 0)
+                self.assertEqual(via_mmap, run_search(query, 1 << 30))
+                self.assertEqual([hit.line for hit in via_mmap], expected_lines)
+
+    def test_search_results_are_cached_until_a_file_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            knowledge.mkdir()
+            faq = knowledge / "faq.md"
+            faq.write_text("Rotate the API key", encoding="utf-8")
+
+            def run_search(query: str) -> list[KnowledgeMatch]:
+                return search_knowledge_markdown(
+                    query, knowledge_dir=knowledge, project_root=root, max_hits=5
+                )
+
+            first = run_search("rotate")
+            with patch("agent.knowledge._python_search") as mock_search:
+                # Same terms, different wording: served from the cache.
+                second = run_search("rotate?")
+            mock_search.assert_not_called()
+
+            faq.write_text("Rotate keys monthly\nRotate tokens weekly", encoding="utf-8")
+            os.utime(faq, ns=(0, 1))
+            # In-place edits are noticed on the next periodic re-check of file stats.
+            with patch("agent.knowledge._FILE_STATS_RECHECK_SECONDS", 0):
+                third = run_search("rotate")
+
+        self.assertEqual(second, first)
+        self.assertEqual([hit.line for hit in third], [1, 2])
+
+    def test_cached_search_stats_directories_only(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            knowledge = root / "knowledge"
+            (knowledge / "nested").mkdir(parents=True)
+            (knowledge / "faq.md").write_text("Rotate the API key", encoding="utf-8")
+            (knowledge / "nested" / "howto.md").write_text("Rotate tokens", encoding="utf-8")
+
+            def run_search() -> list[KnowledgeMatch]:
+                return search_knowledge_markdown(
+                    "rotate", knowledge_dir=knowledge, project_root=root, max_hits=5
+                )
+
+            first = run_search()
+            with patch("agent.knowledge.os.stat", wraps=os.stat) as mock_stat:
+                second = run_search()
+
+        stated = {str(call.args[0]) for call in mock_stat.call_args_list}
+        self.assertEqual(second, first)
+        self.assertEqual(stated, {str(knowledge), str(knowledge / "nested")})
@@ -0,0 +1,24 @@
+"""Unit tests for path safety helpers."""
+
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+
+from agent.path_utils import is_within
+
+
+class IsWithinTests(unittest.TestCase):
+    """Validate containment checks on resolved paths."""
+
+    def test_equal_and_nested_paths_are_within(self) -> None:
+        root = Path("/srv/app")
+        self.assertTrue(is_within(root, root))
+        self.assertTrue(is_within(Path("/srv/app/knowledge/a.md"), root))
+
+    def test_sibling_with_shared_prefix_is_outside(self) -> None:
+        self.assertFalse(is_within(Path("/srv/app-other/a.md"), Path("/srv/app")))
+        self.assertFalse(is_within(Path("/srv"), Path("/srv/app")))
+
+    def test_filesystem_root_contains_everything(self) -> None:
+        self.assertTrue(is_within(Path("/srv/app"), Path("/")))
@@ -5,7 +5,7 @@ from __future__ import annotations
 import unittest
 from unittest.mock import patch
 
-from agent.sanitizer import sanitize
+from agent.sanitizer import StreamSanitizer, sanitize, set_project_root
 
 
 class SanitizerTests(unittest.TestCase):
@@ -29,11 +29,16 @@ class SanitizerTests(unittest.TestCase):
 
     def test_converts_project_absolute_path_to_relative(self) -> None:
         raw = "/Users/alice/work/app/scripts/demo.py"
-        with patch("agent.sanitizer.os.getcwd", return_value="/Users/alice/work/app"):
+        with patch("agent.sanitizer._PROJECT_ROOT_PREFIX", "/Users/alice/work/app/"):
             with patch("agent.sanitizer._HOME", "/Users/alice"):
                 cleaned = sanitize(raw)
         self.assertEqual(cleaned, "scripts/demo.py")
 
+    def test_set_project_root_controls_relative_paths(self) -> None:
+        with patch("agent.sanitizer._PROJECT_ROOT_PREFIX", "/"):
+            set_project_root("/opt/app/")
+            self.assertEqual(sanitize("/opt/other /opt/app/main.py"), "[redacted-path] main.py")
+
     def test_redacts_home_path(self) -> None:
         raw = "/Users/alice/.ssh/id_rsa"
         with patch("agent.sanitizer._HOME", "/Users/alice"):
@@ -44,3 +49,87 @@ class SanitizerTests(unittest.TestCase):
         raw = "/etc/passwd"
         cleaned = sanitize(raw)
         self.assertEqual(cleaned, "[redacted-path]")
+
+    def test_plain_text_is_returned_unchanged(self) -> None:
+        raw = "Use `foo(bar)` then run the tests; tokens like abc-123 are fine."
+        self.assertIs(sanitize(raw), raw)
+
+    def test_short_fragments_are_returned_unchanged(self) -> None:
+        for raw in ("", "ok", "/tmp"):
+            self.assertIs(sanitize(raw), raw)
+
+    def test_text_without_path_prefix_skips_path_regex(self) -> None:
+        raw = "Compare /tmpfile and /usr/local/bin/python before merging the change."
+        with patch("agent.sanitizer._RE_ABS_PATH") as path_re:
+            self.assertIs(sanitize(raw), raw)
+        path_re.search.assert_not_called()
+        path_re.sub.assert_not_called()
+
+    def test_path_regex_runs_once_on_text_with_path(self) -> None:
+        raw = "See /tmp/build/output.log for the full trace."
+        with patch("agent.sanitizer._RE_ABS_PATH") as path_re:
+            path_re.sub.return_value = "redacted"
+            self.assertEqual(sanitize(raw), "redacted")
+        path_re.search.assert_not_called()
+        path_re.sub.assert_called_once()
+
+    def test_redacts_secret_nested_in_home_path(self) -> None:
+        raw = (
+            "see /Users/alice/.claude/projects/demo/out.json"
+            " and /Users/alice/x.sk-ant-REDACTED"
+        )
+        with patch("agent.sanitizer._HOME", "/Users/alice"):
+            cleaned = sanitize(raw)
+        self.assertEqual(cleaned, "see ~/[internal-path] and ~/x.[REDACTED_API_KEY]")
+
+    def test_redacts_mixed_text_in_one_pass(self) -> None:
+        raw = "key sk-ant-REDACTED, file /etc/hosts, plain words"
+        cleaned = sanitize(raw)
+        self.assertEqual(cleaned, "key [REDACTED_API_KEY], file [redacted-path], plain words")
+
+    def test_redacts_token_directly_after_key(self) -> None:
+        raw = "key=sk-ant-" + "A" * 30 + "/" + "Zq9" * 15
+        self.assertEqual(sanitize(raw), "key=[REDACTED_API_KEY][REDACTED_TOKEN]")
+
+    def test_key_preceded_by_alphanumerics_is_reported_as_key(self) -> None:
+        raw = "aaaaaaaaaaaask-ant-" + "B" * 30
+        self.assertEqual(sanitize(raw), "aaaaaaaaaaaa[REDACTED_API_KEY]")
+
+
+class StreamSanitizerTests(unittest.TestCase):
+    """Chunked sanitization must match sanitizing the whole text."""
+
+    def test_redacts_key_split_across_chunks(self) -> None:
+        stream = StreamSanitizer()
+        chunks = ["key: sk-ant-ABCDEF", "GHIJKLMNOPQRSTUVWXYZ", " done"]
+        out = "".join(stream.feed(chunk) for chunk in chunks) + stream.flush()
+        self.assertEqual(out, "key: [REDACTED_API_KEY] done")
+
+    def test_holds_back_only_unfinished_word(self) -> None:
+        stream = StreamSanitizer()
+        self.assertEqual(stream.feed("hello wor"), "hello ")
+        self.assertEqual(stream.feed("ld"), "")
+        self.assertEqual(stream.flush(), "world")
+        self.assertEqual(stream.flush(), "")
+
+    def test_chunked_output_matches_whole_text(self) -> None:
+        text = "see /etc/hosts, .claude/projects/x/y.json and sk-ant-REDACTED."
+        for size in (1, 3, 7, 16):
+            stream = StreamSanitizer()
+            out = "".join(stream.feed(text[i : i + size]) for i in range(0, len(text), size))
+            self.assertEqual(out + stream.flush(), sanitize(text))
+
+    def test_streams_japanese_text_without_boundary_characters(self) -> None:
+        stream = StreamSanitizer()
+        self.assertEqual(stream.feed("これは日本"), "これは日本")
+        self.assertEqual(stream.feed("語の回答です。"), "語の回答です。")
+        self.assertEqual(stream.feed("設定は/tmp/設定"), "設定は")
+        self.assertEqual(stream.feed("です。"), "")
+        self.assertEqual(stream.flush(), "[redacted-path]")
+
+    def test_japanese_chunked_output_matches_whole_text(self) -> None:
+        text = "キーはsk-ant-REDACTEDです。パスは/etc/hostsです。完了"
+        for size in (1, 2, 5, 9):
+            stream = StreamSanitizer()
+            out = "".join(stream.feed(text[i : i + size]) for i in range(0, len(text), size))
+            self.assertEqual(out + stream.flush(), sanitize(text))
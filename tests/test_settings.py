@@ -111,6 +111,8 @@ class SettingsTests(unittest.TestCase):
         self.assertEqual(settings.KNOWLEDGE_MAX_HITS, 8)
         self.assertEqual(settings.CONTEXT_MAX_CHARS, 12000)
         self.assertEqual(settings.REQUESTS_PER_MINUTE_LIMIT, 20)
+        self.assertEqual(settings.STREAM_FLUSH_INTERVAL_MS, 50)
+        self.assertFalse(settings.STREAMING_RAW_TEXT)
 
     def test_context_related_settings_parse_custom_values(self) -> None:
         with patch.dict(
@@ -139,6 +141,16 @@ class SettingsTests(unittest.TestCase):
         self.assertEqual(settings.KNOWLEDGE_MAX_HITS, 5)
         self.assertEqual(settings.CONTEXT_MAX_CHARS, 9000)
 
+    def test_allowed_extensions_are_normalized_and_deduplicated(self) -> None:
+        with patch.dict(
+            os.environ,
+            {"ANTHROPIC_API_KEY": "dummy", "ATTACHMENTS_ALLOWED_EXT": " .MD, txt,md,,.Txt ,csv"},
+            clear=True,
+        ):
+            settings = self._reload_settings()
+
+        self.assertEqual(settings.ATTACHMENTS_ALLOWED_EXTENSIONS, ("md", "txt", "csv"))
+
     def test_requests_per_minute_limit_parses_custom_value(self) -> None:
         with patch.dict(
             os.environ,
@@ -152,6 +164,26 @@ class SettingsTests(unittest.TestCase):
 
         self.assertEqual(settings.REQUESTS_PER_MINUTE_LIMIT, 12)
 
+    def test_streaming_raw_text_can_be_enabled(self) -> None:
+        with patch.dict(
+            os.environ,
+            {"ANTHROPIC_API_KEY": "dummy", "STREAMING_RAW_TEXT": "true"},
+            clear=True,
+        ):
+            settings = self._reload_settings()
+
+        self.assertTrue(settings.STREAMING_RAW_TEXT)
+
+    def test_stream_flush_interval_parses_custom_value(self) -> None:
+        with patch.dict(
+            os.environ,
+            {"ANTHROPIC_API_KEY": "dummy", "STREAM_FLUSH_INTERVAL_MS": "100"},
+            clear=True,
+        ):
+            settings = self._reload_settings()
+
+        self.assertEqual(settings.STREAM_FLUSH_INTERVAL_MS, 100)
+
     def test_custom_model_is_respected(self) -> None:
         with patch.dict(
             os.environ,
@@ -0,0 +1,22 @@
+"""Unit tests for injected UI assets."""
+
+from __future__ import annotations
+
+import unittest
+
+from config.ui_assets import CUSTOM_CSS_PAYLOAD, IME_FIX_JS_PAYLOAD, _compact_markup
+
+
+class UiAssetsTests(unittest.TestCase):
+    """Compaction must keep the markup intact."""
+
+    def test_compact_markup_strips_indentation_and_blank_lines(self) -> None:
+        markup = "\n<script>\n    var a = 1;\n\n    // note\n    f(a);\n</script>\n"
+        self.assertEqual(_compact_markup(markup), "<script>\nvar a = 1;\n// note\nf(a);\n</script>")
+
+    def test_payloads_are_compacted(self) -> None:
+        for payload in (CUSTOM_CSS_PAYLOAD, IME_FIX_JS_PAYLOAD):
+            lines = payload.split("\n")
+            self.assertTrue(all(line and line == line.strip() for line in lines))
+        self.assertTrue(CUSTOM_CSS_PAYLOAD.startswith("<style>"))
+        self.assertTrue(IME_FIX_JS_PAYLOAD.endswith("</script>"))